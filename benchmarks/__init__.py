@@ -0,0 +1,16 @@
+import os
+
+# The bot reads its configuration at import time
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+os.environ.setdefault("ADMIN_IDS", "1")
+os.environ.setdefault("POSTGRES_USER", "bench")
+os.environ.setdefault("POSTGRES_PASSWORD", "bench")
+os.environ.setdefault("POSTGRES_DB", "bench")
+os.environ.setdefault("YOOKASSA_ENABLED", "true")
+os.environ.setdefault("YOOKASSA_SHOP_ID", "100500")
+os.environ.setdefault("YOOKASSA_SECRET_KEY", "test_benchmark")
+os.environ.setdefault("YOOKASSA_RETURN_URL", "https://t.me/bench_bot")
+os.environ.setdefault("YOOKASSA_DEFAULT_RECEIPT_EMAIL", "bench@example.com")
+os.environ.setdefault("TELEGRAM_CHAT_RATE", "1000")
+os.environ.setdefault("TELEGRAM_GLOBAL_RATE", "100000")
+os.environ["WEBHOOK_HOST"] = ""
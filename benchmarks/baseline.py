@@ -0,0 +1,46 @@
+import json
+import os
+from typing import Dict, List, Sequence
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """ Nearest-rank percentile of an unsorted sequence. """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def load_baseline(path: str) -> Dict[str, float]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: Dict[str, float]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write("\n")
+
+
+def find_regressions(
+    results: Dict[str, float], baseline: Dict[str, float], max_regression: float, higher_is_better: Sequence[str] = ()
+) -> List[str]:
+    """
+    Compares results with the baseline. Timings may grow and throughputs (keys listed in
+    `higher_is_better`) may drop by at most `max_regression` (a fraction, 0.2 = 20%).
+    """
+    regressions = []
+    for key, expected in baseline.items():
+        actual = results.get(key)
+        if actual is None or not expected:
+            continue
+        if key in higher_is_better:
+            change = (expected - actual) / expected
+        else:
+            change = (actual - expected) / expected
+        if change > max_regression:
+            regressions.append(f"{key}: {actual:.4g} vs baseline {expected:.4g} ({change:+.0%})")
+    return regressions
@@ -0,0 +1,154 @@
+"""
+Stress check of the per-chat update serialization (ChatSequenceMiddleware).
+
+Simulates rapid taps: many callback queries per chat are fed into a Dispatcher at once,
+with handlers that yield to the event loop at random points, while payment notifications
+take the same locks through serialized(). Checks that
+
+- updates of one chat never run concurrently and run in arrival order,
+- different chats do run concurrently,
+- a failing handler releases its lock,
+- the lock map is empty once everything has finished.
+
+    python -m benchmarks.chat_lock
+    python -m benchmarks.chat_lock --chats 500 --taps 50
+
+Exits with code 1 when a check fails.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Update
+
+from bot.middlewares.chat_lock import ChatSequenceMiddleware
+
+
+class Recorder:
+    def __init__(self):
+        self.running: Dict[int, int] = defaultdict(int)
+        self.max_running_per_chat = 0
+        self.total_running = 0
+        self.max_total_running = 0
+        self.order: Dict[int, List[int]] = defaultdict(list)
+
+    async def run(self, chat_id: int, seq: int, fail: bool = False):
+        self.running[chat_id] += 1
+        self.total_running += 1
+        self.max_running_per_chat = max(self.max_running_per_chat, self.running[chat_id])
+        self.max_total_running = max(self.max_total_running, self.total_running)
+        self.order[chat_id].append(seq)
+        try:
+            for _ in range(random.randint(0, 3)):
+                await asyncio.sleep(random.random() / 1000)
+            if fail:
+                raise RuntimeError("handler failed")
+        finally:
+            self.running[chat_id] -= 1
+            self.total_running -= 1
+
+
+def build_dispatcher(chat_sequence: ChatSequenceMiddleware, recorder: Recorder) -> Dispatcher:
+    router = Router()
+
+    @router.callback_query()
+    async def tap_handler(callback_query):
+        seq = int(callback_query.data)
+        await recorder.run(callback_query.from_user.id, seq, fail=seq % 7 == 3)
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(chat_sequence)
+    dp.include_router(router)
+    return dp
+
+
+def tap(update_id: int, chat_id: int, seq: int) -> Update:
+    user = {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"}
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": str(chat_id),
+            "data": str(seq),
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": "Вопрос",
+            },
+        },
+    })
+
+
+async def run(chats: int, taps: int) -> List[str]:
+    bot = Bot(token="123456:CHATLOCK")
+    chat_sequence = ChatSequenceMiddleware()
+    recorder = Recorder()
+    dp = build_dispatcher(chat_sequence, recorder)
+    update_ids = itertools.count(1)
+
+    async def feed(update: Update):
+        try:
+            await dp.feed_update(bot, update)
+        except RuntimeError:
+            pass
+
+    async def payment_notification(chat_id: int, seq: int):
+        # Payment webhooks run outside the dispatcher but take the same lock
+        async with chat_sequence.serialized(chat_id, chat_id):
+            await recorder.run(chat_id, seq)
+
+    # Updates of every chat are created in arrival order and started in that order
+    coroutines = []
+    for seq in range(taps):
+        for chat_id in range(1, chats + 1):
+            if seq == taps // 2:
+                coroutines.append(payment_notification(chat_id, seq))
+            else:
+                coroutines.append(feed(tap(next(update_ids), chat_id, seq)))
+    started_at = time.perf_counter()
+    await asyncio.gather(*coroutines)
+    elapsed = time.perf_counter() - started_at
+    await bot.session.close()
+
+    print(f"Chats: {chats}, updates per chat: {taps}, {chats * taps / elapsed:.0f} updates/s")
+    print(f"Max concurrent per chat: {recorder.max_running_per_chat}, overall: {recorder.max_total_running}")
+    print(f"Locks left: {chat_sequence.active_chats}")
+
+    failures = []
+    if recorder.max_running_per_chat != 1:
+        failures.append(f"updates of one chat ran concurrently ({recorder.max_running_per_chat} at once)")
+    if chats > 1 and recorder.max_total_running < 2:
+        failures.append("different chats were serialized with each other")
+    expected = list(range(taps))
+    out_of_order = [chat_id for chat_id, order in recorder.order.items() if order != expected]
+    if out_of_order or len(recorder.order) != chats:
+        failures.append(f"{len(out_of_order)} chats processed updates out of order or incompletely")
+    if chat_sequence.active_chats:
+        failures.append(f"{chat_sequence.active_chats} chat locks were not released")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--taps", type=int, default=20, help="Updates fed per chat at once")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    failures = asyncio.run(run(args.chats, args.taps))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+End-to-end load test of the bot.
+
+Drives the real Dispatcher (routers, middlewares, FSM, database) with synthetic updates for many
+concurrent virtual users. Telegram and YooKassa are replaced by a local fake HTTP server, the
+database by SQLite (or any SQLAlchemy URL, e.g. a local Postgres).
+
+Each virtual user goes through /start -> tariff -> payment webhook -> questionnaires -> booking.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.e2e --users 1000 --concurrency 200
+    python -m benchmarks.e2e --users 1000 --baseline benchmarks/e2e_baseline.json --max-regression 0.25
+
+Exits with code 1 when a virtual user does not complete the flow, before any baseline is compared or written.
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.bot import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Update
+from aiohttp import web
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bot.database.models import TimeSlot
+from bot.handlers import payment_success
+from bot.main import init_database, setup_dispatcher
+from bot.services.questionnaire_service import questionnaire_service
+
+from .baseline import find_regressions, load_baseline, percentile, save_baseline
+
+BOT_ID = 123456
+ADMIN_ID = 1
+DONE_MARKER = "успешно записаны"
+
+
+class FakeApiServer:
+    """
+    Minimal stand-in for the Telegram Bot API and the YooKassa API. Keeps the text and
+    keyboard of every message so that virtual users can "see" and tap buttons.
+    """
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self.messages: Dict[int, Dict[int, Dict[str, Any]]] = defaultdict(dict)
+        self.last_message: Dict[int, int] = {}
+        self.payments_by_user: Dict[int, Dict[str, Any]] = {}
+        self._message_ids = itertools.count(1)
+        self.app = web.Application()
+        self.app.router.add_post("/bot{token}/{method}", self.bot_api_handler)
+        self.app.router.add_post("/v3/payments", self.create_payment_handler)
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    async def start(self) -> str:
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def _message(self, chat_id: int, message_id: int) -> Dict[str, Any]:
+        stored = self.messages[chat_id][message_id]
+        result = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench"},
+            "text": stored["text"],
+        }
+        if stored["reply_markup"]:
+            result["reply_markup"] = stored["reply_markup"]
+        return result
+
+    async def bot_api_handler(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+
+        def ok(result):
+            return web.json_response({"ok": True, "result": result})
+
+        if method == "getMe":
+            return ok({"id": BOT_ID, "is_bot": True, "first_name": "Bench", "username": "bench_bot"})
+
+        chat_id = int(params["chat_id"]) if "chat_id" in params else None
+        reply_markup = json.loads(params["reply_markup"]) if params.get("reply_markup") else None
+
+        if method in ("sendMessage", "sendPhoto"):
+            message_id = next(self._message_ids)
+            self.messages[chat_id][message_id] = {"text": params.get("text", ""), "reply_markup": reply_markup}
+            self.last_message[chat_id] = message_id
+            return ok(self._message(chat_id, message_id))
+
+        if method in ("editMessageText", "editMessageReplyMarkup"):
+            message_id = int(params["message_id"])
+            stored = self.messages[chat_id].setdefault(message_id, {"text": "", "reply_markup": None})
+            if method == "editMessageText":
+                stored["text"] = params.get("text", "")
+            stored["reply_markup"] = reply_markup
+            self.last_message[chat_id] = message_id
+            return ok(self._message(chat_id, message_id))
+
+        return ok(True)
+
+    async def create_payment_handler(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.calls["yookassa.create_payment"] += 1
+        payment_id = str(uuid.uuid4())
+        payment = {
+            "id": payment_id,
+            "status": "pending",
+            "paid": False,
+            "amount": body["amount"],
+            "confirmation": {"type": "redirect", "confirmation_url": f"{self.base_url}/pay/{payment_id}"},
+            "created_at": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "description": body.get("description"),
+            "metadata": body.get("metadata", {}),
+            "recipient": {"account_id": "100500", "gateway_id": "1"},
+            "refundable": False,
+            "test": True,
+        }
+        self.payments_by_user[int(payment["metadata"]["user_id"])] = payment
+        return web.json_response(payment)
+
+    def current_message(self, chat_id: int) -> Dict[str, Any]:
+        return self._message(chat_id, self.last_message[chat_id])
+
+
+class Harness:
+    def __init__(self, bot: Bot, dispatcher, session_maker: async_sessionmaker, api: FakeApiServer):
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.session_maker = session_maker
+        self.api = api
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.db_round_trips = 0
+        self.updates = 0
+        self.completed_users = 0
+        self.failed_users: Counter = Counter()
+        self._update_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+
+    async def _feed(self, step: str, update: Dict[str, Any]):
+        update["update_id"] = next(self._update_ids)
+        started_at = time.perf_counter()
+        await self.dispatcher.feed_update(self.bot, Update.model_validate(update, context={"bot": self.bot}))
+        self.latencies[step].append(time.perf_counter() - started_at)
+        self.updates += 1
+
+    @staticmethod
+    def _user(user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "username": f"user{user_id}"}
+
+    async def send_text(self, step: str, user_id: int, text: str):
+        message = {
+            "message_id": next(self._update_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        await self._feed(step, {"message": message})
+
+    async def tap(self, step: str, user_id: int, data: str):
+        callback_query = {
+            "id": str(next(self._callback_ids)),
+            "from": self._user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": self.api.current_message(user_id),
+        }
+        await self._feed(step, {"callback_query": callback_query})
+
+    async def pay(self, user_id: int):
+        payment = dict(self.api.payments_by_user[user_id], status="succeeded", paid=True)
+        body = {"type": "notification", "event": "payment.succeeded", "object": payment}
+        started_at = time.perf_counter()
+        await payment_success.process_yookassa_notification(self.bot, self.dispatcher, self.session_maker, body)
+        self.latencies["payment_webhook"].append(time.perf_counter() - started_at)
+        self.updates += 1
+
+    async def _current_step(self, user_id: int) -> str:
+        key = StorageKey(bot_id=self.bot.id, chat_id=user_id, user_id=user_id)
+        state = await self.dispatcher.storage.get_state(key)
+        if state and state.startswith("QuestionnaireFSM"):
+            data = await self.dispatcher.storage.get_data(key)
+            return f"questionnaire:{data.get('current_questionnaire_title')}"
+        return "booking"
+
+    async def run_user(self, user_id: int, max_actions: int, back_rate: float):
+        await self.send_text("start", user_id, "/start")
+        await self.tap("tariff", user_id, "tariff:Базовый")
+        if user_id not in self.api.payments_by_user:
+            self.failed_users["payment_not_created"] += 1
+            return
+        await self.pay(user_id)
+
+        for _ in range(max_actions):
+            message = self.api.current_message(user_id)
+            if DONE_MARKER in message["text"]:
+                self.completed_users += 1
+                return
+
+            step = await self._current_step(user_id)
+            buttons = [
+                button["callback_data"]
+                for row in (message.get("reply_markup") or {}).get("inline_keyboard", [])
+                for button in row if "callback_data" in button
+            ]
+            single = [data for data in buttons if re.match(r"^q\d+o\d+$", data)]
+            multi = [data for data in buttons if re.match(r"^m\d+o\d+$", data)]
+            done = [data for data in buttons if data.startswith("mdone")]
+            dates = [data for data in buttons if data.startswith("select_date:")]
+            times = [data for data in buttons if data.startswith("select_time:")]
+
+            if "back" in buttons and random.random() < back_rate:
+                await self.tap(step, user_id, "back")
+            elif single:
+                await self.tap(step, user_id, random.choice(single))
+            elif multi and done:
+                await self.tap(step, user_id, random.choice(multi))
+                await self.tap(step, user_id, done[0])
+            elif times:
+                await self.tap(step, user_id, random.choice(times))
+            elif dates:
+                await self.tap(step, user_id, random.choice(dates))
+            elif message["text"].startswith("Вопрос"):
+                await self.send_text(step, user_id, "5")
+            else:
+                self.failed_users[f"stuck:{message['text'][:40]}"] += 1
+                return
+        self.failed_users["too_many_actions"] += 1
+
+
+def instrument_round_trips(engine, harness: Harness):
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        harness.db_round_trips += 1
+
+
+async def seed_slots(session_maker: async_sessionmaker, count: int):
+    """ Adds enough future slots (10 per day) for every virtual user to book one. """
+    start = datetime.date.today() + datetime.timedelta(days=1)
+    rows = []
+    for index in range(count):
+        day, hour = divmod(index, 10)
+        rows.append({"date": start + datetime.timedelta(days=day), "time": datetime.time(9 + hour), "is_available": True})
+    async with session_maker() as session:
+        await session.execute(insert(TimeSlot), rows)
+        await session.commit()
+
+
+async def run(args) -> Tuple[Dict[str, float], bool]:
+    """ Results of the run and whether every virtual user completed the flow. """
+    from yookassa import Configuration
+
+    api = FakeApiServer()
+    base_url = await api.start()
+    Configuration.api_url = f"{base_url}/v3"
+
+    engine = create_async_engine(args.database_url, connect_args=args.connect_args)
+    session_maker = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await init_database(session_maker)
+    await seed_slots(session_maker, args.users * 2)
+    async with session_maker() as session:
+        await questionnaire_service.load_from_db(session)
+
+    bot = Bot(
+        token=os.environ["BOT_TOKEN"],
+        session=AiohttpSession(api=TelegramAPIServer.from_base(base_url)),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    dispatcher = setup_dispatcher(bot, session_maker)
+    harness = Harness(bot, dispatcher, session_maker, api)
+    instrument_round_trips(engine, harness)
+    harness.db_round_trips = 0
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_user(user_id: int):
+        async with semaphore:
+            try:
+                await harness.run_user(user_id, args.max_actions, args.back_rate)
+            except Exception as e:
+                harness.failed_users[f"error:{type(e).__name__}"] += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(run_user(1_000_000 + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started_at
+    # Let debounced edits and other background tasks finish before shutting down
+    await asyncio.sleep(1)
+
+    await bot.session.close()
+    await api.stop()
+    await engine.dispose()
+
+    results: Dict[str, float] = {
+        "throughput_updates_per_s": harness.updates / elapsed,
+        "db_round_trips_per_update": harness.db_round_trips / max(harness.updates, 1),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    for step, values in sorted(harness.latencies.items()):
+        results[f"{step}.p50_ms"] = percentile(values, 0.50) * 1000
+        results[f"{step}.p99_ms"] = percentile(values, 0.99) * 1000
+
+    print(f"Users: {args.users} (completed {harness.completed_users}), concurrency: {args.concurrency}")
+    print(f"Updates: {harness.updates} in {elapsed:.1f}s -> {results['throughput_updates_per_s']:.1f} updates/s")
+    print(f"DB round trips per update: {results['db_round_trips_per_update']:.2f}")
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB")
+    print(f"{'step':<30}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for step, values in sorted(harness.latencies.items()):
+        print(f"{step:<30}{len(values):>8}{results[step + '.p50_ms']:>10.2f}{results[step + '.p99_ms']:>10.2f}")
+    print("Bot API calls: " + ", ".join(f"{method}={count}" for method, count in api.calls.most_common()))
+    if harness.failed_users:
+        print("Failures: " + ", ".join(f"{reason}={count}" for reason, count in harness.failed_users.items()))
+    return results, harness.completed_users == args.users and not harness.failed_users
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--max-actions", type=int, default=400, help="Safety limit of actions per user")
+    parser.add_argument("--back-rate", type=float, default=0.05, help="Share of questions where the user taps 'Back'")
+    parser.add_argument("--database-url", default=None, help="Defaults to a temporary SQLite database")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Compare with (or, with --update-baseline, write) this baseline file")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    args.connect_args = {}
+    if args.database_url is None:
+        args.database_url = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.sqlite3"
+    if args.database_url.startswith("sqlite"):
+        args.connect_args = {"timeout": 60}
+
+    results, completed = asyncio.run(run(args))
+
+    if args.json:
+        save_baseline(args.json, results)
+    if not completed:
+        # Timings of a broken flow are not comparable, and must never become the baseline
+        print("Not every user completed the flow." + (" Baseline not written." if args.update_baseline else ""))
+        sys.exit(1)
+    if args.baseline:
+        if args.update_baseline:
+            save_baseline(args.baseline, results)
+            print(f"Baseline written to {args.baseline}")
+            return
+        baseline = load_baseline(args.baseline)
+        if not baseline:
+            print(f"No baseline at {args.baseline}; record one with --update-baseline.")
+            sys.exit(1)
+        regressions = find_regressions(
+            results, baseline, args.max_regression,
+            higher_is_better=("throughput_updates_per_s",),
+        )
+        if regressions:
+            print("Performance regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Import-time report of the bot entrypoints, from `python -X importtime`.
+
+Imports the entrypoint in a fresh interpreter, prints the total and the slowest modules by
+cumulative time, and checks that optional subsystems (YooKassa SDK, webhook server,
+migrations, seeding data) are not imported at startup; they are loaded when first used.
+
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --module bot_v2.main --top 30
+
+Exits with code 1 when a lazily loaded module is imported by the entrypoint.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use only: payments, the webhook mode, migrations and the first-run seeding
+LAZY_MODULES = (
+    "yookassa",
+    "aiogram.webhook.aiohttp_server",
+    "alembic",
+    "bot.workers",
+    "bot.database.seed",
+    "bot.data.basic_questionnaire_data",
+    "bot.data.ayurved_m_questionnaire_data",
+    "bot.data.ayurved_j_questionnaire_data",
+)
+
+
+def measure(module: str) -> Tuple[Dict[str, Tuple[int, int]], int]:
+    """ Imports `module` in a subprocess. Returns {module: (self µs, cumulative µs)} and the total µs. """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=os.environ, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    timings: Dict[str, Tuple[int, int]] = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = len(name) - len(name.lstrip())
+        name = name.strip()
+        timings[name] = (int(self_us), int(cumulative_us))
+        if depth == 1:  # top-level imports of the entrypoint; nested ones are in their cumulative time
+            total += int(cumulative_us)
+    return timings, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="bot.main", help="Entrypoint to import")
+    parser.add_argument("--top", type=int, default=20, help="How many of the slowest modules to print")
+    args = parser.parse_args()
+
+    timings, total = measure(args.module)
+    print(f"{args.module}: {len(timings)} modules imported in {total / 1000:.1f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    slowest = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:8.1f}  {name}")
+
+    eager: List[str] = [
+        lazy for lazy in LAZY_MODULES
+        if any(name == lazy or name.startswith(lazy + ".") for name in timings)
+    ]
+    if eager:
+        print("Imported at startup, but should be loaded lazily:\n  " + "\n  ".join(eager))
+        sys.exit(1)
+    print("Optional subsystems are not imported at startup.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Microbenchmarks of the questionnaire engine hot path, on the real data from bot/data.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.micro                      # compare with benchmarks/micro_baseline.json
+    python -m benchmarks.micro --update-baseline    # record a new baseline on the reference machine
+
+Every benchmark reports the best per-call time (µs) over several repeats. The run fails
+(exit code 1) when a benchmark is slower than the baseline by more than --max-regression,
+or has no baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bot.handlers.booking import format_answers
+from bot.services.answer_summary import add_to_summary, render_summary, split_message
+from bot.keyboards.questionnaire import get_question_keyboard
+from bot.main import init_database
+from bot.services.questionnaire_service import QuestionnaireService
+
+from .baseline import find_regressions, load_baseline, save_baseline
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "micro_baseline.json")
+
+
+def best_time_us(func: Callable[[], object], repeat: int) -> float:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def build_answers(service: QuestionnaireService) -> Dict[str, str]:
+    """ One plausible answer for every question of every questionnaire, as stored in FSM data. """
+    answers = {}
+    for title in ("basic", "ayurved_m", "ayurved_j"):
+        cache = service.get_questionnaire_by_title(title)
+        for question in cache.questions.values():
+            if question.type == "multi":
+                answers[str(question.id)] = json.dumps(question.options[:2], ensure_ascii=False)
+            elif question.options:
+                answers[str(question.id)] = question.options[0]
+            else:
+                answers[str(question.id)] = "5"
+    return answers
+
+
+async def prepare(database_url: str) -> Tuple[async_sessionmaker, QuestionnaireService]:
+    engine = create_async_engine(database_url)
+    session_maker = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    await init_database(session_maker)
+    service = QuestionnaireService()
+    async with session_maker() as session:
+        await service.load_from_db(session)
+    return session_maker, service
+
+
+def run(database_url: str, repeat: int) -> Dict[str, float]:
+    loop = asyncio.new_event_loop()
+    session_maker, service = loop.run_until_complete(prepare(database_url))
+    results: Dict[str, float] = {}
+
+    async def load_once():
+        async with session_maker() as session:
+            await QuestionnaireService().load_from_db(session)
+
+    results["load_from_db"] = best_time_us(lambda: loop.run_until_complete(load_once()), repeat)
+
+    basic = service.get_questionnaire_by_title("basic")
+    transitions: List[Tuple[int, str]] = [
+        (question_id, answer)
+        for question_id, rules in basic.logic.items()
+        for answer in list(rules) + ["не совпадает"]
+    ]
+
+    def next_question_ids():
+        for question_id, answer in transitions:
+            basic.get_next_question_id(question_id, answer)
+
+    results["get_next_question_id"] = best_time_us(next_question_ids, repeat) / len(transitions)
+
+    questions = [
+        question
+        for title in ("basic", "ayurved_m", "ayurved_j")
+        for question in service.get_questionnaire_by_title(title).questions.values()
+    ]
+    selections = {question.id: question.options[:2] for question in questions if question.type == "multi"}
+
+    def keyboards():
+        for question in questions:
+            get_question_keyboard(question, selections.get(question.id))
+
+    results["get_question_keyboard"] = best_time_us(keyboards, repeat) / len(questions)
+
+    answers = build_answers(service)
+    results["format_answers"] = best_time_us(lambda: format_answers(answers, service), repeat)
+
+    summary = {}
+    for q_id_str, answer in answers.items():
+        add_to_summary(summary, service.get_question(int(q_id_str)), answer)
+    results["render_summary"] = best_time_us(lambda: split_message(render_summary(summary, service)[0]), repeat)
+
+    loop.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Defaults to a temporary SQLite database")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/micro.sqlite3"
+    results = run(database_url, args.repeat)
+
+    baseline = load_baseline(args.baseline)
+    print(f"{'benchmark':<25}{'µs/call':>12}{'baseline':>12}")
+    for name, value in results.items():
+        expected = baseline.get(name)
+        print(f"{name:<25}{value:>12.2f}{(f'{expected:.2f}' if expected else '-'):>12}")
+
+    if args.update_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not baseline:
+        print(f"No baseline at {args.baseline}; record one with --update-baseline.")
+        sys.exit(1)
+    regressions = find_regressions(results, baseline, args.max_regression)
+    regressions += [f"{name}: no baseline, record one with --update-baseline" for name in results if name not in baseline]
+    if regressions:
+        print("Performance regressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
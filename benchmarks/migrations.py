@@ -0,0 +1,87 @@
+"""
+Upgrade check of the data migrations on a database created before them.
+
+Migrates a temporary SQLite database to the first revision, fills it with the kind of data
+old versions of the bot could leave behind (time slots added twice, booked and not), then
+migrates it to head and checks the result.
+
+    python -m benchmarks.migrations
+
+Exits with code 1 when the upgrade fails or a check does not hold.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+from typing import List
+
+from alembic import command
+from alembic.config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LEGACY_DATA = """
+INSERT INTO tariffs (id, name, price) VALUES (1, 'Базовый', 100);
+INSERT INTO users (id, telegram_id, has_paid) VALUES (1, 1001, 1), (2, 1002, 1), (3, 1003, 1);
+INSERT INTO time_slots (id, date, time, is_available) VALUES
+    (1, '2025-07-01', '10:00:00.000000', 1),
+    (2, '2025-07-01', '10:00:00.000000', 0),
+    (3, '2025-07-01', '11:00:00.000000', 0),
+    (4, '2025-07-01', '11:00:00.000000', 0),
+    (5, '2025-07-01', '12:00:00.000000', 1),
+    (6, '2025-07-01', '12:00:00.000000', 1),
+    (7, '2025-07-01', '13:00:00.000000', 1);
+INSERT INTO bookings (id, user_id, slot_id, status) VALUES
+    (1, 1, 2, 'confirmed'),
+    (2, 2, 3, 'confirmed'),
+    (3, 3, 4, 'confirmed');
+"""
+
+# slot id -> (time, is_available) expected after the upgrade
+EXPECTED_SLOTS = {
+    2: ("10:00:00.000000", 0),  # the booked copy wins over an unbooked one with a lower id
+    3: ("11:00:00.000000", 0),  # of two booked copies the first is kept
+    5: ("12:00:00.000000", 1),
+    7: ("13:00:00.000000", 1),
+}
+# booking id -> slot id
+EXPECTED_BOOKINGS = {1: 2, 2: 3, 3: 3}
+
+
+def upgrade(path: str, revision: str):
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "bot", "database", "migrations"))
+    config.set_main_option("sqlalchemy.url", f"sqlite+aiosqlite:///{path}")
+    command.upgrade(config, revision)
+
+
+def check(path: str) -> List[str]:
+    upgrade(path, "0001_initial")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_DATA)
+    try:
+        upgrade(path, "head")
+    except Exception as e:
+        return [f"upgrade to head failed: {e!r}"]
+
+    failures = []
+    with sqlite3.connect(path) as conn:
+        slots = {row[0]: row[1:] for row in conn.execute("SELECT id, time, is_available FROM time_slots")}
+        bookings = dict(conn.execute("SELECT id, slot_id FROM bookings"))
+    if slots != EXPECTED_SLOTS:
+        failures.append(f"time slots: expected {EXPECTED_SLOTS}, got {slots}")
+    if bookings != EXPECTED_BOOKINGS:
+        failures.append(f"bookings: expected {EXPECTED_BOOKINGS}, got {bookings}")
+    return failures
+
+
+def main():
+    failures = check(os.path.join(tempfile.mkdtemp(), "migrations.sqlite3"))
+    if failures:
+        print("Failed:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("Legacy data upgraded to head.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import SecretStr
 from typing import List
+import datetime
 import logging
 
 class Settings(BaseSettings):
@@ -24,6 +25,19 @@ class Settings(BaseSettings):
     YOOKASSA_PAYMENT_MODE: str = "full_prepayment"
     YOOKASSA_PAYMENT_SUBJECT: str = "service"
 
+    # --- Questionnaire ---
+    MULTI_SELECT_DEBOUNCE_SECONDS: float = 0.5 # Window for coalescing keyboard edits of multi-choice questions
+
+    # --- Outbound Telegram API flood control ---
+    TELEGRAM_GLOBAL_RATE: float = 30.0 # Requests per second to all chats together, shared by all workers
+    TELEGRAM_CHAT_RATE: float = 1.0 # Requests per second to a single chat
+    TELEGRAM_CHAT_BURST: int = 3 # Requests a single chat may receive in a burst
+    TELEGRAM_MAX_RETRIES: int = 3 # Retries after a 429 (retry_after) response
+
+    # --- Admin schedule ---
+    ADMIN_SLOT_TIMES: str = "09:00,10:00,11:00,12:00,13:00,14:00,15:00,16:00,17:00,18:00" # Times offered when adding a single slot
+    SLOT_OCCUPANCY_CACHE_TTL: float = 60.0 # Seconds the admin calendar month overview is cached per worker
+
     # --- Service Price ---
     SERVICE_PRICE: float = 1000.00
 
@@ -33,6 +47,46 @@ class Settings(BaseSettings):
     WEB_SERVER_HOST: str = "0.0.0.0"
     WEB_SERVER_PORT: int = 8080
 
+    # --- Multi-worker webhook settings ---
+    WEB_WORKERS: int = 1 # Number of worker processes behind the webhook port
+    WORKER_BASE_PORT: int = 8081 # Workers listen on 127.0.0.1:WORKER_BASE_PORT + index
+    WORKER_INDEX: int | None = None # Set by the front dispatcher for spawned workers
+
+    # --- FSM storage ---
+    REDIS_URL: str | None = None # Shared FSM storage, required when WEB_WORKERS > 1
+
+    # --- Metrics ---
+    METRICS_ENABLED: bool = True
+    METRICS_PORT: int = 9100 # Port of the /metrics side server in polling mode
+
+    # --- SQL profiling (opt-in) ---
+    SQL_PROFILING: bool = False
+    SQL_PROFILE_SLOW_MS: float = 100.0 # Log handlers whose statements take longer in total
+    SQL_PROFILE_MAX_STATEMENTS: int = 10 # Log handlers issuing more statements per update
+
+    # --- Background jobs ---
+    SCHEDULER_ENABLED: bool = True
+    PENDING_PAYMENT_TTL_HOURS: float = 24.0 # Pending payments older than this are marked expired
+    FSM_IDLE_TTL_HOURS: float = 72.0 # FSM state of users idle for longer is dropped
+    DATA_RETENTION_DAYS: int = 180 # Expired and canceled payments, finished jobs and abandoned questionnaire sessions older than this are deleted
+    JOB_QUEUE_POLL_SECONDS: float = 30.0 # How often due reminders are looked up
+    JOB_QUEUE_BATCH_SIZE: int = 200 # Jobs claimed per query
+    JOB_QUEUE_CONCURRENCY: int = 20 # Jobs of a batch run at the same time
+
+    # --- Questionnaire answers ---
+    QUESTIONNAIRE_RESULTS_ENABLED: bool = True # Keep one answers document per user and questionnaire, updated on every answer
+    QUESTIONNAIRE_SESSIONS_ENABLED: bool = True # Save the progress on every question, so /continue works after the FSM state is gone
+
+    # --- Event loop watchdog ---
+    LOOP_WATCHDOG_ENABLED: bool = True
+    LOOP_LAG_THRESHOLD_MS: float = 250.0 # Log the loop thread stack when it is blocked for longer
+    LOOP_SLOW_CALLBACK_DEBUG: bool = False # Also enable asyncio debug mode with slow_callback_duration
+
+    # --- Tracing ---
+    TRACING_ENABLED: bool = False
+    TRACE_SAMPLE_RATE: float = 0.01 # Share of updates recorded with full spans
+    TRACE_EXPORT_PATH: str | None = None # JSON lines file for spans, stdout when empty
+
     # --- Database settings ---
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
@@ -51,6 +105,22 @@ class Settings(BaseSettings):
             logging.error("Could not parse ADMIN_IDS. Please ensure it's a comma-separated list of numbers.")
             return []
 
+    @property
+    def telegram_global_rate_per_process(self) -> float:
+        """ Share of TELEGRAM_GLOBAL_RATE for this process: Telegram limits the bot, not the worker. """
+        if self.WORKER_INDEX is None:
+            return self.TELEGRAM_GLOBAL_RATE
+        return self.TELEGRAM_GLOBAL_RATE / max(self.WEB_WORKERS, 1)
+
+    @property
+    def admin_slot_times_list(self) -> List[datetime.time]:
+        """ Parses the ADMIN_SLOT_TIMES string into a list of times. """
+        try:
+            return [datetime.time.fromisoformat(value.strip().zfill(5)) for value in self.ADMIN_SLOT_TIMES.split(',') if value.strip()]
+        except ValueError:
+            logging.error("Could not parse ADMIN_SLOT_TIMES. Please ensure it's a comma-separated list of HH:MM times.")
+            return []
+
     @property
     def database_url(self) -> str:
         """ Correctly constructs the database URL. """
@@ -0,0 +1,105 @@
+"""Initial schema, as created by Base.metadata.create_all before migrations were introduced
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2025-07-01 00:00:00
+
+Databases created by the bot before migrations existed already have this schema:
+mark them with `alembic stamp 0001_initial`, then run `alembic upgrade head`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_initial"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "tariffs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False, unique=True),
+        sa.Column("description", sa.String()),
+        sa.Column("price", sa.Float(), nullable=False),
+    )
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("telegram_id", sa.BigInteger(), nullable=False, unique=True),
+        sa.Column("username", sa.String(), nullable=True),
+        sa.Column("tariff_id", sa.Integer(), sa.ForeignKey("tariffs.id"), nullable=True),
+        sa.Column("has_paid", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "payments",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("provider_charge_id", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_table(
+        "questionnaires",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False, unique=True),
+    )
+    op.create_table(
+        "tariff_questionnaires",
+        sa.Column("tariff_id", sa.Integer(), sa.ForeignKey("tariffs.id"), primary_key=True),
+        sa.Column("questionnaire_id", sa.Integer(), sa.ForeignKey("questionnaires.id"), primary_key=True),
+    )
+    op.create_table(
+        "questions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("questionnaire_id", sa.Integer(), sa.ForeignKey("questionnaires.id"), nullable=False),
+        sa.Column("text", sa.String(), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("options", sa.JSON(), nullable=True),
+    )
+    op.create_table(
+        "question_logic",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("question_id", sa.Integer(), sa.ForeignKey("questions.id"), nullable=False),
+        sa.Column("answer_value", sa.String(), nullable=False),
+        sa.Column("next_question_id", sa.Integer(), sa.ForeignKey("questions.id"), nullable=True),
+    )
+    op.create_table(
+        "answers",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("question_id", sa.Integer(), sa.ForeignKey("questions.id"), nullable=False),
+        sa.Column("answer_text", sa.String()),
+        sa.Column("photo_file_id", sa.String()),
+    )
+    op.create_table(
+        "time_slots",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("time", sa.Time(), nullable=False),
+        sa.Column("is_available", sa.Boolean()),
+    )
+    op.create_table(
+        "bookings",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("slot_id", sa.Integer(), sa.ForeignKey("time_slots.id"), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in (
+        "bookings", "time_slots", "answers", "question_logic", "questions",
+        "tariff_questionnaires", "questionnaires", "payments", "users", "tariffs",
+    ):
+        op.drop_table(table)
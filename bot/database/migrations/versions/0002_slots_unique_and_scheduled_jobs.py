@@ -0,0 +1,87 @@
+"""Unique slot date and time, scheduled_jobs table
+
+Revision ID: 0002_slots_jobs
+Revises: 0001_initial
+Create Date: 2025-07-10 00:00:00
+
+"""
+from itertools import groupby
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_slots_jobs"
+down_revision: Union[str, Sequence[str], None] = "0001_initial"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _merge_duplicate_slots() -> None:
+    """
+    Slots added twice before the constraint existed are merged into one row per date and time:
+    a booked copy is kept if there is one (otherwise the first), bookings of the other copies are
+    moved to it and the copies are deleted.
+    """
+    bind = op.get_bind()
+    time_slots = sa.table(
+        "time_slots", sa.column("id"), sa.column("date"), sa.column("time"), sa.column("is_available")
+    )
+    bookings = sa.table("bookings", sa.column("slot_id"))
+
+    duplicates = (
+        sa.select(time_slots.c.date, time_slots.c.time)
+        .group_by(time_slots.c.date, time_slots.c.time)
+        .having(sa.func.count() > 1)
+        .subquery()
+    )
+    booked = sa.exists().where(bookings.c.slot_id == time_slots.c.id)
+    rows = bind.execute(
+        sa.select(
+            time_slots.c.id, time_slots.c.date, time_slots.c.time, time_slots.c.is_available,
+            booked.label("booked"),
+        )
+        .join(duplicates, sa.and_(time_slots.c.date == duplicates.c.date, time_slots.c.time == duplicates.c.time))
+        .order_by(time_slots.c.date, time_slots.c.time, time_slots.c.id)
+    ).all()
+
+    for _, group in groupby(rows, key=lambda row: (row.date, row.time)):
+        group = list(group)
+        keeper = next((row for row in group if row.booked), group[0])
+        others = [row.id for row in group if row.id != keeper.id]
+        bind.execute(bookings.update().where(bookings.c.slot_id.in_(others)).values(slot_id=keeper.id))
+        bind.execute(time_slots.delete().where(time_slots.c.id.in_(others)))
+        if any(row.booked or row.is_available is False for row in group):
+            bind.execute(time_slots.update().where(time_slots.c.id == keeper.id).values(is_available=False))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _merge_duplicate_slots()
+    with op.batch_alter_table("time_slots") as batch_op:
+        batch_op.create_unique_constraint("uq_time_slots_date_time", ["date", "time"])
+
+    op.create_table(
+        "scheduled_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("run_at", sa.DateTime(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("dedupe_key", sa.String(), nullable=False, unique=True),
+        sa.Column("locked_until", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_scheduled_jobs_status_run_at", "scheduled_jobs", ["status", "run_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_scheduled_jobs_status_run_at", table_name="scheduled_jobs")
+    op.drop_table("scheduled_jobs")
+    with op.batch_alter_table("time_slots") as batch_op:
+        batch_op.drop_constraint("uq_time_slots_date_time", type_="unique")
@@ -0,0 +1,50 @@
+"""Indexes on foreign keys and hot lookups
+
+Revision ID: 0003_indexes
+Revises: 0002_slots_jobs
+Create Date: 2025-07-15 00:00:00
+
+time_slots(date, time) is already covered by uq_time_slots_date_time.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_indexes"
+down_revision: Union[str, Sequence[str], None] = "0002_slots_jobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FOREIGN_KEY_INDEXES = (
+    ("answers", "user_id"),
+    ("answers", "question_id"),
+    ("bookings", "user_id"),
+    ("bookings", "slot_id"),
+    ("payments", "user_id"),
+    ("questions", "questionnaire_id"),
+    ("question_logic", "question_id"),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column in FOREIGN_KEY_INDEXES:
+        op.create_index(f"ix_{table}_{column}", table, [column])
+    # YooKassa webhook lookups; also guarantees one payment row per YooKassa payment
+    op.create_index("ix_payments_provider_charge_id", "payments", ["provider_charge_id"], unique=True)
+    # The expiry job scans pending payments only, a small fraction of the table
+    op.create_index(
+        "ix_payments_pending_created_at", "payments", ["created_at"],
+        postgresql_where=sa.text("status = 'pending'"), sqlite_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_payments_pending_created_at", table_name="payments")
+    op.drop_index("ix_payments_provider_charge_id", table_name="payments")
+    for table, column in reversed(FOREIGN_KEY_INDEXES):
+        op.drop_index(f"ix_{table}_{column}", table_name=table)
@@ -0,0 +1,32 @@
+"""schema_meta table for markers such as the seed version
+
+Revision ID: 0004_schema_meta
+Revises: 0003_indexes
+Create Date: 2025-07-20 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_schema_meta"
+down_revision: Union[str, Sequence[str], None] = "0003_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "schema_meta",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("value", sa.String(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("schema_meta")
@@ -0,0 +1,39 @@
+"""questionnaire_results table with one answers document per user and questionnaire
+
+Revision ID: 0005_questionnaire_results
+Revises: 0004_schema_meta
+Create Date: 2025-07-24 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_questionnaire_results"
+down_revision: Union[str, Sequence[str], None] = "0004_schema_meta"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "questionnaire_results",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("questionnaire_title", sa.String(), nullable=False),
+        sa.Column("answers", sa.JSON().with_variant(postgresql.JSONB(), "postgresql"), nullable=False),
+        sa.Column("completed", sa.Boolean(), nullable=False),
+        sa.Column("updated_at", sa.DateTime()),
+        # Leads with user_id, so it also serves lookups of a user's results
+        sa.UniqueConstraint("user_id", "questionnaire_title", name="uq_questionnaire_results_user_title"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("questionnaire_results")
@@ -0,0 +1,38 @@
+"""questionnaire_sessions table for resuming questionnaires
+
+Revision ID: 0006_questionnaire_sessions
+Revises: 0005_questionnaire_results
+Create Date: 2025-07-28 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_questionnaire_sessions"
+down_revision: Union[str, Sequence[str], None] = "0005_questionnaire_results"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "questionnaire_sessions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False, unique=True),
+        sa.Column("current_questionnaire_title", sa.String(), nullable=False),
+        sa.Column("current_question_id", sa.Integer(), nullable=False),
+        sa.Column("pending_questionnaires", sa.JSON(), nullable=False),
+        sa.Column("question_history", sa.JSON(), nullable=False),
+        sa.Column("data", sa.JSON(), nullable=False),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("questionnaire_sessions")
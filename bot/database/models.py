@@ -10,9 +10,13 @@ from sqlalchemy import (
     Date,
     Time,
     ForeignKey,
+    Index,
     JSON,
     Table,
+    UniqueConstraint,
+    text as sql_text,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -49,11 +53,18 @@ class Tariff(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # Stale pending payments are looked up by the expiry job; other statuses are the vast majority
+        Index(
+            "ix_payments_pending_created_at", "created_at",
+            postgresql_where=sql_text("status = 'pending'"), sqlite_where=sql_text("status = 'pending'"),
+        ),
+    )
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     amount = Column(Float, nullable=False)
     status = Column(String, nullable=False)
-    provider_charge_id = Column(String, nullable=True)
+    provider_charge_id = Column(String, nullable=True, unique=True, index=True)  # YooKassa payment id
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     user = relationship("User", back_populates="payments")
 
@@ -74,7 +85,7 @@ class Questionnaire(Base):
 class Question(Base):
     __tablename__ = "questions"
     id = Column(Integer, primary_key=True)
-    questionnaire_id = Column(Integer, ForeignKey("questionnaires.id"), nullable=False)
+    questionnaire_id = Column(Integer, ForeignKey("questionnaires.id"), nullable=False, index=True)
     text = Column(String, nullable=False)
     type = Column(String, nullable=False)
     options = Column(JSON, nullable=True)
@@ -90,7 +101,7 @@ Questionnaire.questions = relationship(
 class QuestionLogic(Base):
     __tablename__ = "question_logic"
     id = Column(Integer, primary_key=True)
-    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False, index=True)
     answer_value = Column(String, nullable=False)
     next_question_id = Column(Integer, ForeignKey("questions.id"), nullable=True)
     question = relationship("Question", back_populates="logic_rules", foreign_keys=[question_id])
@@ -99,8 +110,8 @@ class QuestionLogic(Base):
 class Answer(Base):
     __tablename__ = "answers"
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False, index=True)
     answer_text = Column(String)
     photo_file_id = Column(String)
     user = relationship("User", back_populates="answers")
@@ -111,8 +122,35 @@ User.answers = relationship("Answer", order_by=Answer.id, back_populates="user")
 Question.answers = relationship("Answer", order_by=Answer.id, back_populates="question")
 
 
+class QuestionnaireResult(Base):
+    """All answers of a user to one questionnaire as a single document, keyed by question id."""
+    __tablename__ = "questionnaire_results"
+    __table_args__ = (UniqueConstraint("user_id", "questionnaire_title", name="uq_questionnaire_results_user_title"),)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    questionnaire_title = Column(String, nullable=False)
+    answers = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+    completed = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+class QuestionnaireSession(Base):
+    """Where a user is in the questionnaires, so the flow can be resumed after the FSM state is gone."""
+    __tablename__ = "questionnaire_sessions"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
+    current_questionnaire_title = Column(String, nullable=False)
+    current_question_id = Column(Integer, nullable=False)
+    pending_questionnaires = Column(JSON, nullable=False)
+    question_history = Column(JSON, nullable=False)
+    data = Column(JSON, nullable=False)  # answers, summary and scores, only when questionnaire_results is off
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
 class TimeSlot(Base):
     __tablename__ = "time_slots"
+    # Also serves as the index for lookups by date
+    __table_args__ = (UniqueConstraint("date", "time", name="uq_time_slots_date_time"),)
     id = Column(Integer, primary_key=True)
     date = Column(Date, nullable=False)
     time = Column(Time, nullable=False)
@@ -122,8 +160,8 @@ class TimeSlot(Base):
 class Booking(Base):
     __tablename__ = "bookings"
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    slot_id = Column(Integer, ForeignKey("time_slots.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    slot_id = Column(Integer, ForeignKey("time_slots.id"), nullable=False, index=True)
     status = Column(String, nullable=False)
     user = relationship("User", back_populates="bookings")
     slot = relationship("TimeSlot", back_populates="bookings")
@@ -133,3 +171,24 @@ User.bookings = relationship("Booking", order_by=Booking.id, back_populates="use
 TimeSlot.bookings = relationship(
     "Booking", order_by=Booking.id, back_populates="slot"
 )
+
+
+class ScheduledJob(Base):
+    __tablename__ = "scheduled_jobs"
+    __table_args__ = (Index("ix_scheduled_jobs_status_run_at", "status", "run_at"),)
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    run_at = Column(DateTime, nullable=False)  # server local time, like time slots
+    status = Column(String, nullable=False, default="pending")  # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    dedupe_key = Column(String, unique=True, nullable=False)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class SchemaMeta(Base):
+    __tablename__ = "schema_meta"
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
@@ -0,0 +1,86 @@
+import logging
+import os
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional, Tuple
+
+from sqlalchemy import delete, insert, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .models import SchemaMeta
+
+if TYPE_CHECKING:
+    from alembic.config import Config
+
+# Head of bot/database/migrations/versions; bump together with every new migration
+SCHEMA_REVISION = "0006_questionnaire_sessions"
+# Bump when seed_database() gains questionnaires, tariffs or links that existing databases
+# should receive; the seed then runs again and adds what is missing
+SEED_MARKER = "seed_version"
+SEED_VERSION = "1"
+
+# The revision matching the tables create_all() used to make before the migrations existed
+LEGACY_REVISION = "0001_initial"
+
+MIGRATIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+_VERSION_QUERY = text(
+    "SELECT (SELECT version_num FROM alembic_version),"
+    f" (SELECT value FROM schema_meta WHERE key = '{SEED_MARKER}')"
+)
+
+
+def alembic_config(connection: Optional[Connection] = None) -> "Config":
+    """ Alembic config that works without alembic.ini, optionally bound to an open connection. """
+    from alembic.config import Config  # Alembic is only loaded when the schema is behind
+
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_PATH)
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+async def _current_versions(engine: AsyncEngine) -> Tuple[Optional[str], Optional[str]]:
+    """ Schema revision and seed version in one round trip; None where the table does not exist yet. """
+    try:
+        async with engine.connect() as conn:
+            return tuple((await conn.execute(_VERSION_QUERY)).one())
+    except (OperationalError, ProgrammingError):
+        return None, None
+
+
+def _migrate(connection: Connection):
+    from alembic import command
+
+    config = alembic_config(connection)
+    tables = inspect(connection).get_table_names()
+    if "alembic_version" not in tables and "users" in tables:
+        logging.info(f"Database was created without migrations, stamping it as {LEGACY_REVISION}.")
+        command.stamp(config, LEGACY_REVISION)
+    command.upgrade(config, "head")
+
+
+async def prepare_database(engine: AsyncEngine, seed: Callable[[], Awaitable[None]]):
+    """
+    Brings the schema to SCHEMA_REVISION and runs the seed when SEED_VERSION changed, so `seed`
+    must only add what is missing. When both are current, which is every boot but the first
+    after a release, this costs a single query and no DDL.
+    """
+    revision, seed_version = await _current_versions(engine)
+    if revision == SCHEMA_REVISION and seed_version == SEED_VERSION:
+        logging.info(f"Database schema {revision} and seed {seed_version} are current.")
+        return
+
+    if revision != SCHEMA_REVISION:
+        logging.info(f"Migrating database schema from {revision} to {SCHEMA_REVISION}...")
+        async with engine.begin() as conn:
+            await conn.run_sync(_migrate)
+
+    if seed_version != SEED_VERSION:
+        logging.info(f"Seeding database from seed version {seed_version} to {SEED_VERSION}...")
+        await seed()
+        async with engine.begin() as conn:
+            await conn.execute(delete(SchemaMeta).where(SchemaMeta.key == SEED_MARKER))
+            await conn.execute(insert(SchemaMeta).values(key=SEED_MARKER, value=SEED_VERSION))
+        logging.info(f"Seed marker set to {SEED_VERSION}.")
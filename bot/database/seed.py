@@ -0,0 +1,144 @@
+import logging
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from .models import Base, Questionnaire, Question, QuestionLogic, Tariff
+from ..data.basic_questionnaire_data import options_data_basic, question_definitions_basic, logic_rules_definitions_basic
+from ..data.ayurved_m_questionnaire_data import question_definitions_ayurved_m
+from ..data.ayurved_j_questionnaire_data import question_definitions_ayurved_j
+
+
+async def _create_questionnaire_from_list(session, title, questions_list):
+    """Helper to create a questionnaire and its questions from a list."""
+    questionnaire = Questionnaire(title=title)
+    session.add(questionnaire)
+    await session.flush()
+
+    questions_to_add = []
+    logic_to_add = []
+    question_map = {}
+    prev_question = None
+
+    for q_def in questions_list:
+        q = Question(
+            questionnaire_id=questionnaire.id,
+            text=q_def['text'],
+            type=q_def['type'],
+            options=q_def.get('options')
+        )
+        questions_to_add.append(q)
+    
+    session.add_all(questions_to_add)
+    await session.flush()
+
+    for i, q_def in enumerate(questions_list):
+        q = questions_to_add[i]
+        question_map[q_def['id']] = q
+
+        if prev_question:
+            logic = QuestionLogic(
+                question_id=prev_question.id,
+                answer_value='любой', 
+                next_question_id=q.id
+            )
+            logic_to_add.append(logic)
+        
+        prev_question = q
+            
+    if prev_question:
+        final_logic = QuestionLogic(
+            question_id=prev_question.id,
+            answer_value='любой',
+            next_question_id=None
+        )
+        logic_to_add.append(final_logic)
+
+    session.add_all(logic_to_add)
+    return questionnaire
+
+
+async def _create_basic_questionnaire(session):
+    basic_questionnaire = Questionnaire(title="basic")
+    session.add(basic_questionnaire)
+    await session.flush()
+
+    question_id_map = {}
+    for q_def in question_definitions_basic:
+        q_options = options_data_basic.get(q_def['id'])
+        question = Question(
+            questionnaire_id=basic_questionnaire.id,
+            text=q_def['text'],
+            type=q_def['type'],
+            options=q_options
+        )
+        session.add(question)
+        await session.flush()
+        question_id_map[q_def['id']] = question.id
+
+    for rule_def in logic_rules_definitions_basic:
+        logic_rule = QuestionLogic(
+            question_id=question_id_map[rule_def['from_id']],
+            answer_value=rule_def['answer'],
+            next_question_id=question_id_map.get(rule_def['to_id'])
+        )
+        session.add(logic_rule)
+    await session.flush()
+    return basic_questionnaire
+
+
+TARIFFS = [
+    {"name": "Базовый", "price": 2500, "description": "Базовый тариф"},
+    {"name": "Сопровождение", "price": 5000, "description": "Тариф с сопровождением"},
+    {"name": "Повторная", "price": 2000, "description": "Повторная консультация"},
+    {"name": "Лайт", "price": 1500, "description": "Легкий тариф"},
+]
+
+# (tariff name, questionnaire title)
+TARIFF_QUESTIONNAIRES = [
+    ("Базовый", "basic"), ("Базовый", "ayurved_m"), ("Базовый", "ayurved_j"),
+    ("Сопровождение", "basic"), ("Сопровождение", "ayurved_m"), ("Сопровождение", "ayurved_j"),
+    ("Лайт", "ayurved_m"), ("Лайт", "ayurved_j"),
+]
+
+
+async def seed_database(session_maker: async_sessionmaker):
+    """
+    Adds the questionnaires, tariffs and links that are missing, matched by title and name,
+    so it can run again on a populated database when SEED_VERSION changes. Existing rows
+    are left as they are.
+    """
+    logging.info("Seeding database with new structure...")
+    async with session_maker() as session:
+        questionnaires = {q.title: q for q in (await session.execute(select(Questionnaire))).scalars()}
+        creators = {
+            "basic": _create_basic_questionnaire,
+            "ayurved_m": lambda session: _create_questionnaire_from_list(session, "ayurved_m", question_definitions_ayurved_m),
+            "ayurved_j": lambda session: _create_questionnaire_from_list(session, "ayurved_j", question_definitions_ayurved_j),
+        }
+        for title, create in creators.items():
+            if title not in questionnaires:
+                logging.info(f"Seeding '{title}' questionnaire...")
+                questionnaires[title] = await create(session)
+        await session.flush()
+
+        tariffs = {t.name: t for t in (await session.execute(select(Tariff))).scalars()}
+        new_tariffs = [Tariff(**tariff) for tariff in TARIFFS if tariff["name"] not in tariffs]
+        if new_tariffs:
+            logging.info(f"Seeding tariffs: {', '.join(t.name for t in new_tariffs)}...")
+            session.add_all(new_tariffs)
+            await session.flush()
+            tariffs.update((t.name, t) for t in new_tariffs)
+
+        tariff_questionnaires_table = Base.metadata.tables['tariff_questionnaires']
+        existing_links = set((await session.execute(
+            select(tariff_questionnaires_table.c.tariff_id, tariff_questionnaires_table.c.questionnaire_id)
+        )).tuples())
+        links = [
+            {"tariff_id": tariffs[name].id, "questionnaire_id": questionnaires[title].id}
+            for name, title in TARIFF_QUESTIONNAIRES
+            if (tariffs[name].id, questionnaires[title].id) not in existing_links
+        ]
+        if links:
+            await session.execute(insert(tariff_questionnaires_table), links)
+        await session.commit()
+        logging.info(f"Seeding done, {len(links)} questionnaire links added.")
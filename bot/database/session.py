@@ -1,3 +1,5 @@
+from typing import Any, Union
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from ..config import settings
 
@@ -18,3 +20,8 @@ async def create_session_maker() -> async_sessionmaker[AsyncSession]:
     return session_maker
 
 
+def dialect_insert(session: AsyncSession, table: Any) -> Union[postgresql.Insert, sqlite.Insert]:
+    """ INSERT of the session's database (PostgreSQL or SQLite), which supports ON CONFLICT clauses. """
+    if session.bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
@@ -0,0 +1,49 @@
+"""
+Exports all questionnaire answers as CSV or JSON Lines, streaming rows from the database.
+
+    python -m bot.export_answers --format csv --output answers.csv
+    python -m bot.export_answers --format jsonl > answers.jsonl
+    python -m bot.export_answers --documents > results.jsonl   # one line per user and questionnaire
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from .database.session import create_session_maker
+from .services.answer_service import EXPORT_FORMATS, export_answers, export_result_documents
+from .services.questionnaire_service import questionnaire_service
+
+
+async def run(export_format: str, documents: bool, output: str) -> int:
+    session_maker = await create_session_maker()
+    async with session_maker() as session:
+        await questionnaire_service.load_from_db(session)
+        out = sys.stdout if output == "-" else open(output, "w", encoding="utf-8", newline="")
+        try:
+            if documents:
+                count = await export_result_documents(session, questionnaire_service, out)
+            else:
+                count = await export_answers(session, questionnaire_service, out, export_format)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    await session_maker.kw["bind"].dispose()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--documents", action="store_true", help="Export questionnaire_results documents as JSON Lines")
+    parser.add_argument("--output", default="-", help="File to write, stdout by default")
+    args = parser.parse_args()
+
+    # Logs go to stderr, so stdout carries only the export
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    count = asyncio.run(run(args.format, args.documents, args.output))
+    logging.info(f"Exported {count} {'documents' if args.documents else 'answers'}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,27 @@
 import datetime
+import os
+import re
+import tempfile
+from typing import Optional
 from aiogram import Router, F, types
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 
 from ..config import settings
 from ..states.admin import AdminFSM
-from ..keyboards.admin import get_admin_main_keyboard, get_admin_back_to_menu_keyboard, get_admin_calendar_keyboard, get_admin_time_slots_keyboard
+from ..keyboards.admin import (
+    get_admin_main_keyboard, get_admin_back_to_menu_keyboard, get_admin_bookings_page_keyboard,
+    get_admin_calendar_keyboard, get_admin_time_slots_keyboard, get_admin_export_keyboard,
+)
 from ..database.models import User, TimeSlot, Booking
+from ..services.admin_service import get_bookings_page, format_bookings_page
+from ..services.answer_service import export_answers, export_result_documents
+from ..services.questionnaire_service import QuestionnaireService
+from ..services.slot_service import (
+    parse_schedule, generate_slots, bulk_create_slots, get_month_occupancy, occupancy_cache, MAX_BULK_SLOTS, SCHEDULE_FORMAT_HELP,
+)
 
 
 router = Router()
@@ -33,13 +45,13 @@ async def admin_command_handler(message: types.Message, state: FSMContext):
 
 
 @router.callback_query(AdminFSM.MENU, F.data == "admin_add_slot_start")
-async def admin_add_slot_start(callback_query: types.CallbackQuery, state: FSMContext):
+async def admin_add_slot_start(callback_query: types.CallbackQuery, state: FSMContext, session: AsyncSession):
     """
     Starts the process of adding a new time slot by showing the calendar.
     """
     await state.set_state(AdminFSM.ADD_SLOT_DATE)
     today = datetime.date.today()
-    calendar_keyboard = await get_admin_calendar_keyboard(today, "admin_add_slot")
+    calendar_keyboard = await get_admin_calendar_keyboard(today, "admin_add_slot", await get_month_occupancy(session, today))
     await callback_query.message.edit_text(
         "Выберите дату для добавления слота:",
         reply_markup=calendar_keyboard
@@ -49,7 +61,7 @@ async def admin_add_slot_start(callback_query: types.CallbackQuery, state: FSMCo
 
 @router.callback_query(AdminFSM.ADD_SLOT_DATE, F.data.startswith("admin_add_slot:prev_month:"))
 @router.callback_query(AdminFSM.ADD_SLOT_DATE, F.data.startswith("admin_add_slot:next_month:"))
-async def admin_calendar_navigation_handler(callback_query: types.CallbackQuery, state: FSMContext):
+async def admin_calendar_navigation_handler(callback_query: types.CallbackQuery, state: FSMContext, session: AsyncSession):
     """
     Handles navigation between months in the admin calendar.
     """
@@ -65,7 +77,7 @@ async def admin_calendar_navigation_handler(callback_query: types.CallbackQuery,
         await callback_query.answer("Неизвестная команда.", show_alert=True)
         return
 
-    calendar_keyboard = await get_admin_calendar_keyboard(new_date, "admin_add_slot")
+    calendar_keyboard = await get_admin_calendar_keyboard(new_date, "admin_add_slot", await get_month_occupancy(session, new_date))
     await callback_query.message.edit_reply_markup(reply_markup=calendar_keyboard)
     await callback_query.answer()
 
@@ -81,12 +93,14 @@ async def admin_select_slot_date_handler(callback_query: types.CallbackQuery, st
     await state.update_data(new_slot_date=selected_date.isoformat())
     await state.set_state(AdminFSM.ADD_SLOT_TIME)
 
-    # Fetch existing slots for this date to mark them as unavailable
-    existing_slots = (await session.execute(
-        select(TimeSlot).where(TimeSlot.date == selected_date)
-    )).scalars().all()
-    
-    time_keyboard = await get_admin_time_slots_keyboard(selected_date, existing_slots, "admin_add_slot")
+    # Existing times are marked as unavailable; the month overview tells whether there are any
+    existing_times = set()
+    if selected_date in await get_month_occupancy(session, selected_date):
+        existing_times = set((await session.execute(
+            select(TimeSlot.time).where(TimeSlot.date == selected_date)
+        )).scalars().all())
+
+    time_keyboard = await get_admin_time_slots_keyboard(selected_date, existing_times, "admin_add_slot")
     await callback_query.message.edit_text(
         f"Выбрана дата: {selected_date.strftime('%d %B %Y')}. Теперь выберите время:",
         reply_markup=time_keyboard
@@ -103,18 +117,12 @@ async def admin_add_time_slot_handler(callback_query: types.CallbackQuery, state
     slot_date = datetime.date.fromisoformat(date_str)
     slot_time = datetime.time.fromisoformat(time_str)
 
-    # Check if slot already exists (should be handled by keyboard, but good to double-check)
-    existing_slot = (await session.execute(
-        select(TimeSlot).where(TimeSlot.date == slot_date, TimeSlot.time == slot_time)
-    )).scalar_one_or_none()
-    
-    if existing_slot:
+    # The keyboard hides existing times, but another admin may have added the slot meanwhile
+    if not await bulk_create_slots(session, [(slot_date, slot_time)]):
         await callback_query.answer("Этот слот уже существует. Выберите другое время.", show_alert=True)
         return
-
-    new_slot = TimeSlot(date=slot_date, time=slot_time, is_available=True)
-    session.add(new_slot)
     await session.commit()
+    occupancy_cache.invalidate(slot_date)
 
     await state.set_state(AdminFSM.MENU)
     await callback_query.message.edit_text(
@@ -125,7 +133,7 @@ async def admin_add_time_slot_handler(callback_query: types.CallbackQuery, state
 
 
 @router.callback_query(AdminFSM.ADD_SLOT_TIME, F.data.startswith("admin_add_slot:back_to_date:"))
-async def admin_add_slot_back_to_date_handler(callback_query: types.CallbackQuery, state: FSMContext):
+async def admin_add_slot_back_to_date_handler(callback_query: types.CallbackQuery, state: FSMContext, session: AsyncSession):
     """
     Returns from time selection to date selection in admin add slot flow.
     """
@@ -133,7 +141,7 @@ async def admin_add_slot_back_to_date_handler(callback_query: types.CallbackQuer
     current_date = datetime.date.fromisoformat(date_str) # Get the month of the date that was previously selected
 
     await state.set_state(AdminFSM.ADD_SLOT_DATE)
-    calendar_keyboard = await get_admin_calendar_keyboard(current_date, "admin_add_slot")
+    calendar_keyboard = await get_admin_calendar_keyboard(current_date, "admin_add_slot", await get_month_occupancy(session, current_date))
     await callback_query.message.edit_text(
         "Выберите дату для добавления слота:",
         reply_markup=calendar_keyboard
@@ -141,20 +149,75 @@ async def admin_add_slot_back_to_date_handler(callback_query: types.CallbackQuer
     await callback_query.answer()
 
 
+@router.callback_query(AdminFSM.MENU, F.data == "admin_bulk_slots_start")
+async def admin_bulk_slots_start(callback_query: types.CallbackQuery, state: FSMContext):
+    """
+    Asks for a schedule template to fill many slots at once.
+    """
+    await state.set_state(AdminFSM.BULK_SCHEDULE)
+    await callback_query.message.edit_text(
+        f"Отправьте расписание одним сообщением.\n\n{SCHEDULE_FORMAT_HELP}",
+        reply_markup=get_admin_back_to_menu_keyboard()
+    )
+    await callback_query.answer()
+
+
+@router.message(AdminFSM.BULK_SCHEDULE, F.text)
+async def admin_bulk_slots_handler(message: types.Message, state: FSMContext, session: AsyncSession):
+    """
+    Generates slots from the schedule template and inserts them in a single statement.
+    """
+    if not is_admin(message.from_user.id):
+        return
+
+    try:
+        slots = generate_slots(parse_schedule(message.text))
+    except ValueError as e:
+        await message.answer(f"{e}\n\n{SCHEDULE_FORMAT_HELP}", reply_markup=get_admin_back_to_menu_keyboard())
+        return
+    if not slots:
+        await message.answer("По этому расписанию не получилось ни одного слота.", reply_markup=get_admin_back_to_menu_keyboard())
+        return
+    if len(slots) > MAX_BULK_SLOTS:
+        await message.answer(
+            f"Слишком много слотов ({len(slots)}), за один раз можно добавить не больше {MAX_BULK_SLOTS}.",
+            reply_markup=get_admin_back_to_menu_keyboard()
+        )
+        return
+
+    created = await bulk_create_slots(session, slots)
+    await session.commit()
+    occupancy_cache.invalidate(*{slot_date for slot_date, _ in slots})
+
+    await state.set_state(AdminFSM.MENU)
+    await message.answer(
+        f"Добавлено слотов: {created}. Уже существовали: {len(slots) - created}.\n"
+        f"Период: {slots[0][0].strftime('%Y-%m-%d')} — {slots[-1][0].strftime('%Y-%m-%d')}.",
+        reply_markup=get_admin_main_keyboard()
+    )
+
+
 @router.callback_query(AdminFSM.MENU, F.data == "admin_list_bookings")
-async def admin_list_bookings_handler(callback_query: types.CallbackQuery, state: FSMContext, session: AsyncSession):
+@router.callback_query(AdminFSM.MENU, F.data.regexp(r"^admin_bookings:(older|newer):(\d+)$").as_("match"))
+async def admin_list_bookings_handler(callback_query: types.CallbackQuery, state: FSMContext, session: AsyncSession, match: Optional[re.Match] = None):
     """
-    Lists all current bookings.
+    Lists bookings page by page, newest first.
     """
     if not is_admin(callback_query.from_user.id):
         await callback_query.answer("У вас нет прав для доступа к админ-панели.", show_alert=True)
         return
 
-    bookings_query = select(Booking).options(selectinload(Booking.user), selectinload(Booking.slot)).order_by(Booking.id.desc())
-    result = await session.execute(bookings_query)
-    bookings = result.scalars().all()
+    direction, cursor = (match.group(1), int(match.group(2))) if match else (None, None)
+    page = await get_bookings_page(
+        session,
+        older_than=cursor if direction == "older" else None,
+        newer_than=cursor if direction == "newer" else None,
+    )
 
-    if not bookings:
+    if not page.rows:
+        if direction:
+            await callback_query.answer("Больше записей нет.")
+            return
         await callback_query.message.edit_text(
             "Активных записей пока нет.",
             reply_markup=get_admin_back_to_menu_keyboard()
@@ -162,21 +225,9 @@ async def admin_list_bookings_handler(callback_query: types.CallbackQuery, state
         await callback_query.answer()
         return
 
-    response_text = "<b>Активные записи:</b>\n\n"
-    for booking in bookings:
-        user_info = f"@{booking.user.username}" if booking.user.username else f"ID: {booking.user.telegram_id}"
-        response_text += (
-            f"Запись №{booking.id}\n"
-            f"Пользователь: {user_info}\n"
-            f"Дата: {booking.slot.date.strftime('%Y-%m-%d')}\n"
-            f"Время: {booking.slot.time.strftime('%H:%M')}\n"
-            f"Статус: {booking.status}\n"
-            "----------------------------\n"
-        )
-    
     await callback_query.message.edit_text(
-        response_text,
-        reply_markup=get_admin_back_to_menu_keyboard()
+        format_bookings_page(page),
+        reply_markup=get_admin_bookings_page_keyboard(page.rows[0].id, page.rows[-1].id, page.has_newer, page.has_older)
     )
     await callback_query.answer()
 
@@ -194,6 +245,53 @@ async def admin_cancel_booking_start(callback_query: types.CallbackQuery, state:
     await callback_query.answer()
 
 
+@router.callback_query(AdminFSM.MENU, F.data == "admin_export_answers")
+async def admin_export_answers_start(callback_query: types.CallbackQuery, state: FSMContext):
+    """
+    Asks for the format of the answers export.
+    """
+    await callback_query.message.edit_text(
+        "Выберите формат выгрузки ответов на опросники:",
+        reply_markup=get_admin_export_keyboard()
+    )
+    await callback_query.answer()
+
+
+@router.callback_query(AdminFSM.MENU, F.data.regexp(r"^admin_export:(csv|jsonl|results)$").as_("match"))
+async def admin_export_answers_handler(
+    callback_query: types.CallbackQuery,
+    state: FSMContext,
+    session: AsyncSession,
+    questionnaire_service: QuestionnaireService,
+    match: re.Match,
+):
+    """
+    Streams all answers, or one document per user and questionnaire, into a temporary file
+    and sends it as a document.
+    """
+    if not is_admin(callback_query.from_user.id):
+        await callback_query.answer("У вас нет прав для доступа к админ-панели.", show_alert=True)
+        return
+
+    export_format = match.group(1)
+    await callback_query.answer("Готовим выгрузку...")
+    extension = "jsonl" if export_format == "results" else export_format
+    fd, path = tempfile.mkstemp(suffix=f".{extension}")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as out:
+            if export_format == "results":
+                count = await export_result_documents(session, questionnaire_service, out)
+            else:
+                count = await export_answers(session, questionnaire_service, out, export_format)
+        filename = f"{'results' if export_format == 'results' else 'answers'}_{datetime.date.today().isoformat()}.{extension}"
+        await callback_query.message.answer_document(
+            types.FSInputFile(path, filename=filename),
+            caption=f"{'Анкет' if export_format == 'results' else 'Ответов'} в выгрузке: {count}"
+        )
+    finally:
+        os.remove(path)
+
+
 @router.callback_query(F.data == "admin_back_to_menu")
 async def admin_back_to_menu_handler(callback_query: types.CallbackQuery, state: FSMContext):
     """
@@ -1,9 +1,12 @@
-from aiogram import Router, F, types
+from aiogram import Bot, Router, F, types
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+import asyncio
 import datetime
-import json # For formatting answers
+import html
+import logging
+from typing import Dict, List, Set, Tuple
 
 from ..states.booking import BookingFSM
 from ..states.questionnaire import QuestionnaireFSM # Import QuestionnaireFSM to get answers
@@ -11,9 +14,32 @@ from ..config import settings
 from ..database.models import TimeSlot, Booking, User, Question # Added Question
 from ..keyboards.booking import get_time_keyboard, get_calendar_keyboard
 from ..services.questionnaire_service import questionnaire_service, QuestionnaireService
+from ..services.slot_service import occupancy_cache
+from ..services.job_queue import enqueue_booking_reminders
+from ..services.dosha_scoring import format_dosha_scores
+from ..services.answer_summary import add_to_summary, render_summary, split_message
+from ..middlewares.rate_limit import low_priority
 
 router = Router()
 
+# Keeps running notification tasks referenced until they finish
+_notification_tasks: Set[asyncio.Task] = set()
+
+
+def format_answers(questionnaire_answers: Dict[str, str], questionnaire_service: QuestionnaireService) -> Tuple[str, List[str]]:
+    """
+    Formats answers stored in FSM data for the admin notification, all at once. Used for
+    states recorded before the summary was built incrementally (see answer_summary).
+    Returns the text and the file ids of photos to send separately.
+    """
+    summary = {}
+    for q_id_str, answer_value in questionnaire_answers.items():
+        question = questionnaire_service.get_question(int(q_id_str))
+        if question:
+            add_to_summary(summary, question, answer_value)
+    lines, photo_file_ids = render_summary(summary, questionnaire_service)
+    return "\n".join(lines), photo_file_ids
+
 
 @router.callback_query(BookingFSM.DATE_SELECT, F.data.startswith("select_date:"))
 async def select_date_handler(callback_query: types.CallbackQuery, state: FSMContext, session: AsyncSession):
@@ -62,65 +88,43 @@ async def select_time_handler(
             status="confirmed"
         )
         session.add(new_booking)
+        await session.flush()
+        # Enqueued in the booking transaction, so a booking never ends up without its reminders
+        await enqueue_booking_reminders(
+            session, new_booking.id, callback_query.from_user.id, datetime.datetime.combine(slot.date, slot.time)
+        )
         await session.commit()
+        occupancy_cache.invalidate(slot.date)
 
-        # Get questionnaire answers
+        # The summary lines were formatted as the answers came in
         fsm_data = await state.get_data()
-        questionnaire_answers = fsm_data.get("answers", {})
-
-        # Fetch all questions from the cache to format answers correctly
-        questions_map = {
-            q.id: q for q in questionnaire_service.get_cache().questions.values()
-        }
-
-        formatted_answers_list = []
-        photo_file_ids_to_send = []
-
-        for q_id_str, answer_value in questionnaire_answers.items():
-            q_id = int(q_id_str)
-            question = questions_map.get(q_id)
-            if not question:
-                continue
-
-            if question.type == "photo":
-                if answer_value and answer_value != "skipped":
-                    formatted_answers_list.append(f"- {question.text}: [Фото приложено ниже]")
-                    photo_file_ids_to_send.append(answer_value)
-                else:
-                    formatted_answers_list.append(f"- {question.text}: Пропущено")
-            elif question.type == "multi":
-                try:
-                    multi_answers = json.loads(answer_value)
-                    formatted_answers_list.append(f"- {question.text}: {', '.join(multi_answers)}")
-                except json.JSONDecodeError:
-                    formatted_answers_list.append(f"- {question.text}: {answer_value} (некорректный формат multi-ответа)")
-            else:
-                formatted_answers_list.append(f"- {question.text}: {answer_value}")
-        
-        formatted_answers = "\n".join(formatted_answers_list)
+        if "answer_summary" in fsm_data:
+            answer_lines, photo_file_ids_to_send = render_summary(fsm_data["answer_summary"], questionnaire_service)
+        else:
+            formatted_answers, photo_file_ids_to_send = format_answers(fsm_data.get("answers", {}), questionnaire_service)
+            answer_lines = formatted_answers.split("\n")
+        dosha_scores = format_dosha_scores(fsm_data.get("dosha_scores", {}))
 
         await callback_query.message.edit_text(
             f"Отлично! Вы успешно записаны на {slot.date.strftime('%d %B %Y')} в {slot.time.strftime('%H:%M')}.\n\n"
             "В ближайшее время с вами свяжется администратор."
         )
 
-        # Send notification to admins
-        admin_notification_text = (
+        # Send notification to admins, split into messages under the Telegram length limit
+        admin_notification_header = (
             f"📅 <b>Новая запись!</b>\n\n"
-            f"Пользователь: {callback_query.from_user.full_name} (@{callback_query.from_user.username})\n"
+            f"Пользователь: {html.escape(callback_query.from_user.full_name)} (@{callback_query.from_user.username})\n"
             f"ID: <code>{callback_query.from_user.id}</code>\n"
             f"На дату: {slot.date.strftime('%Y-%m-%d')}\n"
-            f"На время: {slot.time.strftime('%H:%M')}\n"
-            f"Ответы на опросник:\n{formatted_answers}"
+            f"На время: {slot.time.strftime('%H:%M')}"
+            + (f"\nДоши:\n{dosha_scores}" if dosha_scores else "")
         )
-        for admin_id in settings.admin_ids_list:
-            try:
-                await callback_query.bot.send_message(admin_id, admin_notification_text)
-                for photo_file_id in photo_file_ids_to_send:
-                    await callback_query.bot.send_photo(admin_id, photo=photo_file_id)
-            except Exception as e:
-                import logging
-                logging.error(f"Failed to send booking notification to admin {admin_id}: {e}")
+        admin_notifications = split_message([admin_notification_header, "Ответы на опросник:", *answer_lines])
+        # Sent in the background: low-priority requests may wait for a while, and the handler
+        # holds the user's chat lock until it returns
+        task = asyncio.create_task(notify_admins(callback_query.bot, admin_notifications, photo_file_ids_to_send))
+        _notification_tasks.add(task)
+        task.add_done_callback(_notification_tasks.discard)
 
         await state.clear() # Clear state after successful booking and notification
     else:
@@ -133,6 +137,19 @@ async def select_time_handler(
     await callback_query.answer()
 
 
+async def notify_admins(bot: Bot, notifications: List[str], photo_file_ids: List[str]):
+    """ Sends the booking notification to every admin as low-priority requests. """
+    with low_priority():
+        for admin_id in settings.admin_ids_list:
+            try:
+                for notification_text in notifications:
+                    await bot.send_message(admin_id, notification_text)
+                for photo_file_id in photo_file_ids:
+                    await bot.send_photo(admin_id, photo=photo_file_id)
+            except Exception as e:
+                logging.error(f"Failed to send booking notification to admin {admin_id}: {e}")
+
+
 @router.callback_query(BookingFSM.TIME_SELECT, F.data == "back_to_date_select")
 async def back_to_date_select_handler(callback_query: types.CallbackQuery, state: FSMContext, session: AsyncSession):
     """
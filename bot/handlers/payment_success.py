@@ -1,7 +1,14 @@
+import logging
+from typing import Any, Dict
 from aiogram import Bot, Router, Dispatcher
 from aiogram.fsm.context import FSMContext
-from sqlalchemy.ext.asyncio import AsyncSession
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import joinedload
+from ..config import settings
 from ..database.models import User, Payment
+from ..services.questionnaire_sessions import delete_session
 from ..states.booking import BookingFSM
 
 router = Router()
@@ -11,16 +18,24 @@ async def on_payment_success(bot: Bot, session: AsyncSession, dispatcher: Dispat
     Handles the logic after a successful payment.
     Starts the correct questionnaire or booking flow based on the user's tariff.
     """
-    from ..services import questionnaire_service  # Lazy import
+    from ..services.questionnaire_service import questionnaire_service  # Lazy import
     
     user = payment.user
-    state = FSMContext(storage=dispatcher.storage, key=str(user.telegram_id))
+    state = FSMContext(
+        storage=dispatcher.storage,
+        key=StorageKey(bot_id=bot.id, chat_id=user.telegram_id, user_id=user.telegram_id),
+    )
 
     tariff = user.tariff
     if not tariff:
         await bot.send_message(user.telegram_id, "Ошибка: не удалось определить ваш тариф.")
         return
 
+    if settings.QUESTIONNAIRE_SESSIONS_ENABLED:
+        # A new flow starts: /continue must not bring back the questionnaires of an earlier payment
+        await delete_session(session, user.id)
+        await session.commit()
+
     if tariff.name == "Повторная":
         await bot.send_message(user.telegram_id, "Спасибо за оплату! Давайте выберем время для вашей повторной консультации.")
         await state.set_state(BookingFSM.DATE_SELECT)
@@ -43,7 +58,7 @@ async def on_payment_success(bot: Bot, session: AsyncSession, dispatcher: Dispat
         await bot.send_message(user.telegram_id, "Не найдено подходящих опросников для вашего тарифа.")
         return
 
-    await state.update_data(pending_questionnaires=pending_questionnaires)
+    await state.update_data(pending_questionnaires=pending_questionnaires, question_history=[], current_question_id=None)
 
     message = await bot.send_message(user.telegram_id, "Начинаем...")
 
@@ -54,3 +69,40 @@ async def on_payment_success(bot: Bot, session: AsyncSession, dispatcher: Dispat
         state=state,
         session=session
     )
+
+
+async def process_yookassa_notification(
+    bot: Bot, dispatcher: Dispatcher, session_maker: async_sessionmaker, notification_body: Dict[str, Any]
+) -> bool:
+    """
+    Applies a YooKassa webhook notification. Returns False for events the bot does not handle.
+    """
+    from yookassa.domain.notification import WebhookNotificationFactory  # Lazy import
+
+    notification = WebhookNotificationFactory().create(notification_body)
+    if notification.event != 'payment.succeeded':
+        return False
+
+    payment_id = notification.object.id
+    async with session_maker() as session:
+        result = await session.execute(
+            select(Payment)
+            .options(joinedload(Payment.user).joinedload(User.tariff))
+            .filter_by(provider_charge_id=payment_id)
+        )
+        payment = result.scalar_one_or_none()
+
+        if payment and payment.user:
+            payment.status = 'succeeded'
+            payment.user.has_paid = True
+            await session.commit()
+            telegram_id = payment.user.telegram_id
+            chat_sequence = dispatcher.get("chat_sequence")
+            if chat_sequence:
+                async with chat_sequence.serialized(telegram_id, telegram_id):
+                    await on_payment_success(bot, session, dispatcher, payment)
+            else:
+                await on_payment_success(bot, session, dispatcher, payment)
+        else:
+            logging.warning(f"Payment with yookassa_id {payment_id} or its user not found.")
+    return True
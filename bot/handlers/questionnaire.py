@@ -1,11 +1,25 @@
+import json
+import logging
+import re
+from typing import Optional
 from aiogram import Router, F, types, Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..config import settings
 from ..states.questionnaire import QuestionnaireFSM
 from ..states.booking import BookingFSM
 from ..keyboards.questionnaire import get_question_keyboard
 from ..keyboards.booking import get_calendar_keyboard
+from ..middlewares.chat_lock import ChatSequenceMiddleware
+from ..services.edit_debouncer import edit_debouncer
+from ..services.render_cache import render_cache
+from ..services.answer_service import record_answer, save_questionnaire_answers
+from ..services.dosha_scoring import dosha_scorer
+from ..services.answer_summary import add_to_summary
+from ..services.questionnaire_sessions import save_session, load_session, delete_session
 
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
@@ -14,7 +28,7 @@ from ..database.models import User, Tariff # Add User and Tariff imports
 router = Router()
 
 def _get_questionnaire_service():
-    from ..services import questionnaire_service
+    from ..services.questionnaire_service import questionnaire_service
     return questionnaire_service
 
 async def end_current_questionnaire_and_proceed(bot: Bot, chat_id: int, message_id: int, state: FSMContext, session: AsyncSession):
@@ -30,6 +44,12 @@ async def end_current_questionnaire_and_proceed(bot: Bot, chat_id: int, message_
     )
     user = user_result.scalar_one_or_none()
 
+    q_cache = _get_questionnaire_service().get_questionnaire_by_title(current_q_title) if current_q_title else None
+    if user and q_cache:
+        # One bulk insert per finished questionnaire instead of a write per answer
+        await save_questionnaire_answers(session, user.id, current_q_title, q_cache, data.get("answers", {}))
+        await session.commit()
+
     if user and user.tariff and user.tariff.name in ["Базовый", "Сопровождение"] and current_q_title == "basic":
         answers = data.get("answers", {})
         basic_q_cache = _get_questionnaire_service().get_questionnaire_by_title("basic")
@@ -42,6 +62,8 @@ async def end_current_questionnaire_and_proceed(bot: Bot, chat_id: int, message_
         
         if gender_question_id:
             gender_answer = answers.get(str(gender_question_id))
+            # The basic questionnaire may be finished again after going back and changing the gender
+            pending = [title for title in pending if title not in ("ayurved_m", "ayurved_j")]
             if gender_answer == "Мужчина":
                 pending.append("ayurved_m")
             elif gender_answer == "Женщина":
@@ -51,15 +73,34 @@ async def end_current_questionnaire_and_proceed(bot: Bot, chat_id: int, message_
     if pending:
         await _get_questionnaire_service().start_questionnaire(bot, chat_id, message_id, state, session)
     else:
+        if user and settings.QUESTIONNAIRE_SESSIONS_ENABLED:
+            await delete_session(session, user.id)
+            await session.commit()
         await state.set_state(BookingFSM.DATE_SELECT)
-        await bot.edit_message_text(
-            chat_id=chat_id, message_id=message_id,
+        await render_cache.render(
+            bot, chat_id, message_id,
             text="Спасибо за ответы! Теперь выберите удобную дату для консультации:",
             reply_markup=await get_calendar_keyboard(session)
         )
 
-async def show_question(bot: Bot, chat_id: int, message_id: int, state: FSMContext, session: AsyncSession, question_id: int):
-    """ Helper function to display a question. """
+async def _render_question(bot: Bot, chat_id: int, message_id: Optional[int], text: str, keyboard: types.InlineKeyboardMarkup) -> int:
+    """
+    Edits the questionnaire message, or sends a new one when there is none or it can no longer
+    be edited (deleted, too old). Returns the id of the message showing the question.
+    """
+    if message_id:
+        try:
+            await render_cache.render(bot, chat_id, message_id, text=text, reply_markup=keyboard)
+            return message_id
+        except TelegramBadRequest as e:
+            logging.info(f"Question message {message_id} in chat {chat_id} can't be edited ({e.message}), sending a new one.")
+            render_cache.forget(chat_id, message_id)
+    sent = await bot.send_message(chat_id, text, reply_markup=keyboard)
+    render_cache.remember(chat_id, sent.message_id, text, keyboard)
+    return sent.message_id
+
+async def show_question(bot: Bot, chat_id: int, message_id: Optional[int], state: FSMContext, session: AsyncSession, question_id: int):
+    """ Helper function to display a question. Without a message id the question is sent as a new message. """
     data = await state.get_data()
     current_q_title = data.get("current_questionnaire_title")
     
@@ -71,31 +112,29 @@ async def show_question(bot: Bot, chat_id: int, message_id: int, state: FSMConte
         return
     
     selected_answers = data.get(f"multi_answers_{question_id}", [])
-    keyboard = get_question_keyboard(question, selected_answers)
+    keyboard = get_question_keyboard(question, selected_answers, can_go_back=bool(data.get("question_history")))
     
-    await bot.edit_message_text(
-        chat_id=chat_id, message_id=message_id,
-        text=f"Вопрос:\n\n{question.text}",
-        reply_markup=keyboard
-    )
-    await state.update_data(current_question_id=question.id)
+    message_id = await _render_question(bot, chat_id, message_id, f"Вопрос:\n\n{question.text}", keyboard)
+    await state.update_data(current_question_id=question.id, question_message_id=message_id)
+    # A re-render of the same question (/continue) does not move the saved position
+    if settings.QUESTIONNAIRE_SESSIONS_ENABLED and data.get("current_question_id") != question.id:
+        await save_session(session, chat_id, data, question.id)
+    # One commit per update, together with the answer recorded by process_answer
+    await session.commit()
 
-async def process_answer(state: FSMContext, question_id: int, answer_value):
-    """ Saves the answer and determines the next question. """
+async def process_answer(state: FSMContext, session: AsyncSession, question_id: int, answer_value):
+    """ Saves the answer and determines the next question. Does not commit, the next render does. """
     data = await state.get_data()
     current_q_title = data.get("current_questionnaire_title")
     q_cache = _get_questionnaire_service().get_questionnaire_by_title(current_q_title)
     question = q_cache.get_question(question_id)
-    
-    if current_q_title == 'basic' and "Укажите ваш пол" in question.text:
-        pending = data.get("pending_questionnaires", [])
-        if answer_value == "Мужчина":
-            pending.append("ayurved_m")
-        elif answer_value == "Женщина":
-            pending.append("ayurved_j")
-        await state.update_data(pending_questionnaires=pending)
 
     answers = data.get("answers", {})
+    scores_update = {}
+    if dosha_scorer.is_scored(question_id):
+        scores_update["dosha_scores"] = dosha_scorer.apply(
+            data.get("dosha_scores", {}), question_id, answer_value, answers.get(str(question_id))
+        )
     logic_answer = answer_value
     if question.type == 'multi':
         answers[str(question_id)] = json.dumps(answer_value, ensure_ascii=False)
@@ -103,31 +142,174 @@ async def process_answer(state: FSMContext, question_id: int, answer_value):
     else:
         answers[str(question_id)] = answer_value
     
+    # Stack of answered question ids across all questionnaires; the back button pops it
     history = data.get("question_history", [])
-    if question_id not in history:
+    if not history or history[-1] != question_id:
         history.append(question_id)
     
-    await state.update_data(answers=answers, question_history=history)
+    summary = add_to_summary(data.get("answer_summary", {}), question, answer_value)
+
+    await state.update_data(answers=answers, question_history=history, answer_summary=summary, **scores_update)
+    if settings.QUESTIONNAIRE_RESULTS_ENABLED:
+        await record_answer(session, state.key.user_id, current_q_title, question_id, answer_value)
     
     return q_cache.get_next_question_id(question_id, logic_answer)
 
-@router.callback_query(QuestionnaireFSM.IN_QUESTIONNAIRE, F.data.startswith("q_"))
-async def answer_handler(cb: types.CallbackQuery, state: FSMContext, session: AsyncSession):
-    parts = cb.data.split('_')
-    question_id = int(parts[1])
-    option_index = int(parts[2])
+async def _advance(cb: types.CallbackQuery, state: FSMContext, session: AsyncSession, next_question_id):
+    if next_question_id:
+        await show_question(cb.bot, cb.from_user.id, cb.message.message_id, state, session, next_question_id)
+    else:
+        await end_current_questionnaire_and_proceed(cb.bot, cb.from_user.id, cb.message.message_id, state, session)
+
+@router.callback_query(QuestionnaireFSM.IN_QUESTIONNAIRE, F.data.regexp(r"^q(\d+)o(\d+)$").as_("match"))
+async def answer_handler(cb: types.CallbackQuery, state: FSMContext, session: AsyncSession, match: re.Match):
+    question_id = int(match.group(1))
+    option_index = int(match.group(2))
     
     data = await state.get_data()
     current_q_title = data.get("current_questionnaire_title")
     q_cache = _get_questionnaire_service().get_questionnaire_by_title(current_q_title)
     question = q_cache.get_question(question_id)
+    if not question or data.get("current_question_id") != question_id:
+        await cb.answer()
+        return
     answer_text = question.options[option_index]
     
-    next_question_id = await process_answer(state, question_id, answer_text)
+    next_question_id = await process_answer(state, session, question_id, answer_text)
+    await _advance(cb, state, session, next_question_id)
+    
+    await cb.answer()
+
+@router.callback_query(QuestionnaireFSM.IN_QUESTIONNAIRE, F.data == "back")
+async def back_handler(cb: types.CallbackQuery, state: FSMContext, session: AsyncSession):
+    """
+    Shows the previously answered question again, also across questionnaires, and takes its
+    answer back so branching, the admin summary and the dosha scores stay consistent.
+    """
+    data = await state.get_data()
+    history = data.get("question_history", [])
+    if not history or cb.message.message_id != data.get("question_message_id"):
+        await cb.answer()
+        return
+    # A keyboard edit still pending from multi-choice toggles would land on the previous question
+    edit_debouncer.cancel(cb.from_user.id, cb.message.message_id)
+
+    question_id = history.pop()
+    update = {"question_history": history}
+    current_q_title = data.get("current_questionnaire_title")
+    previous_q_title = _get_questionnaire_service().get_questionnaire_title(question_id)
+    if previous_q_title is None:
+        await cb.answer()
+        return
+    if previous_q_title != current_q_title:
+        # The questionnaire being left goes back to the front of the queue
+        update["current_questionnaire_title"] = previous_q_title
+        update["pending_questionnaires"] = [current_q_title, *data.get("pending_questionnaires", [])]
+
+    answers = data.get("answers", {})
+    previous_answer = answers.pop(str(question_id), None)
+    if previous_answer is not None and dosha_scorer.is_scored(question_id):
+        update["dosha_scores"] = dosha_scorer.retract(data.get("dosha_scores", {}), question_id, previous_answer)
+    summary = data.get("answer_summary", {})
+    summary.pop(str(question_id), None)
+
+    await state.update_data(answers=answers, answer_summary=summary, **update)
+    await show_question(cb.bot, cb.from_user.id, cb.message.message_id, state, session, question_id)
+    await cb.answer()
+
+@router.message(Command("continue"))
+async def continue_handler(message: types.Message, state: FSMContext, session: AsyncSession):
+    """
+    Re-sends the current question as a new message. When the FSM state is gone (idle users
+    are purged, the bot restarted without Redis), the progress is restored from the database.
+    """
+    data = await state.get_data()
+    if await state.get_state() != QuestionnaireFSM.IN_QUESTIONNAIRE.state or not data.get("current_question_id"):
+        saved = None
+        if settings.QUESTIONNAIRE_SESSIONS_ENABLED:
+            saved = await load_session(session, message.from_user.id, _get_questionnaire_service())
+        if not saved:
+            await message.answer("Незавершенного опроса нет. Чтобы начать, отправьте /start.")
+            return
+        await state.set_state(QuestionnaireFSM.IN_QUESTIONNAIRE)
+        await state.set_data(saved)
+        data = saved
+
+    q_cache = _get_questionnaire_service().get_questionnaire_by_title(data.get("current_questionnaire_title"))
+    if not q_cache or not q_cache.get_question(data["current_question_id"]):
+        await message.answer("Не удалось продолжить опрос. Чтобы начать заново, отправьте /start.")
+        return
+    await show_question(message.bot, message.chat.id, None, state, session, data["current_question_id"])
+
+@router.message(QuestionnaireFSM.IN_QUESTIONNAIRE, F.text, ~F.text.startswith("/"))
+async def text_answer_handler(message: types.Message, state: FSMContext, session: AsyncSession):
+    """ Accepts a typed answer to a 'text' question and edits the questionnaire message. """
+    data = await state.get_data()
+    question_id = data.get("current_question_id")
+    q_cache = _get_questionnaire_service().get_questionnaire_by_title(data.get("current_questionnaire_title"))
+    question = q_cache.get_question(question_id) if q_cache else None
+
+    if not question or question.type != "text":
+        await message.answer("Пожалуйста, выберите вариант ответа с помощью кнопок.")
+        return
 
+    message_id = data.get("question_message_id")
+    next_question_id = await process_answer(state, session, question_id, message.text)
     if next_question_id:
-        await show_question(cb.bot, cb.from_user.id, cb.message.message_id, state, session, next_question_id)
+        await show_question(message.bot, message.chat.id, message_id, state, session, next_question_id)
     else:
-        await end_current_questionnaire_and_proceed(cb.bot, cb.from_user.id, cb.message.message_id, state, session)
-    
+        await end_current_questionnaire_and_proceed(message.bot, message.chat.id, message_id, state, session)
+
+@router.callback_query(QuestionnaireFSM.IN_QUESTIONNAIRE, F.data.regexp(r"^m(\d+)o(\d+)$").as_("match"))
+async def multi_toggle_handler(
+    cb: types.CallbackQuery, state: FSMContext, match: re.Match,
+    chat_sequence: Optional[ChatSequenceMiddleware] = None
+):
+    """
+    Toggles an option of a multi-choice question. The FSM data is updated right away,
+    while the keyboard edit is debounced so quick taps result in a single API call.
+    """
+    question_id = int(match.group(1))
+    option_index = int(match.group(2))
+
+    data = await state.get_data()
+    q_cache = _get_questionnaire_service().get_questionnaire_by_title(data.get("current_questionnaire_title"))
+    question = q_cache.get_question(question_id)
+    if not question or data.get("current_question_id") != question_id:
+        await cb.answer()
+        return
+
+    option_text = question.options[option_index]
+    selected_answers = data.get(f"multi_answers_{question_id}", [])
+    if option_text in selected_answers:
+        selected_answers.remove(option_text)
+    else:
+        selected_answers.append(option_text)
+    await state.update_data({f"multi_answers_{question_id}": selected_answers})
+
+    edit_debouncer.schedule(
+        cb.bot, cb.from_user.id, cb.message.message_id,
+        get_question_keyboard(question, selected_answers, can_go_back=bool(data.get("question_history"))),
+        chat_sequence
+    )
+    await cb.answer()
+
+@router.callback_query(QuestionnaireFSM.IN_QUESTIONNAIRE, F.data.regexp(r"^mdone(\d+)$").as_("match"))
+async def multi_done_handler(cb: types.CallbackQuery, state: FSMContext, session: AsyncSession, match: re.Match):
+    question_id = int(match.group(1))
+    edit_debouncer.cancel(cb.from_user.id, cb.message.message_id)
+
+    data = await state.get_data()
+    if data.get("current_question_id") != question_id:
+        await cb.answer()
+        return
+
+    selected_answers = data.get(f"multi_answers_{question_id}", [])
+    if not selected_answers:
+        await cb.answer("Выберите хотя бы один вариант.", show_alert=True)
+        return
+
+    next_question_id = await process_answer(state, session, question_id, selected_answers)
+    await _advance(cb, state, session, next_question_id)
+
     await cb.answer()
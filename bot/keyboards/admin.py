@@ -1,8 +1,9 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 import datetime
-from typing import List, Optional
+from typing import Dict, Optional, Set
 
-from ..database.models import TimeSlot
+from ..config import settings
+from ..services.slot_service import DayOccupancy
 
 
 def get_admin_main_keyboard() -> InlineKeyboardMarkup:
@@ -13,16 +14,36 @@ def get_admin_main_keyboard() -> InlineKeyboardMarkup:
         [
             InlineKeyboardButton(text="➕ Добавить слот", callback_data="admin_add_slot_start"),
         ],
+        [
+            InlineKeyboardButton(text="🗓 Заполнить расписание", callback_data="admin_bulk_slots_start"),
+        ],
         [
             InlineKeyboardButton(text="👀 Список записей", callback_data="admin_list_bookings"),
         ],
         [
             InlineKeyboardButton(text="❌ Отменить запись", callback_data="admin_cancel_booking"),
         ],
+        [
+            InlineKeyboardButton(text="📤 Выгрузить ответы", callback_data="admin_export_answers"),
+        ],
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+def get_admin_export_keyboard() -> InlineKeyboardMarkup:
+    """
+    Generates the choice of the answers export format.
+    """
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="CSV", callback_data="admin_export:csv"),
+            InlineKeyboardButton(text="JSONL", callback_data="admin_export:jsonl"),
+        ],
+        [InlineKeyboardButton(text="Анкеты целиком (JSONL)", callback_data="admin_export:results")],
+        [InlineKeyboardButton(text="⬅️ Назад в админку", callback_data="admin_back_to_menu")],
+    ])
+
+
 def get_admin_back_to_menu_keyboard() -> InlineKeyboardMarkup:
     """
     Generates a simple keyboard with a 'Back to Admin Menu' button.
@@ -32,13 +53,34 @@ def get_admin_back_to_menu_keyboard() -> InlineKeyboardMarkup:
     ])
 
 
+def get_admin_bookings_page_keyboard(first_id: int, last_id: int, has_newer: bool, has_older: bool) -> InlineKeyboardMarkup:
+    """
+    Generates navigation for a page of the bookings list. The callbacks carry the boundary
+    booking ids of the current page, used as keyset cursors.
+    """
+    navigation = []
+    if has_newer:
+        navigation.append(InlineKeyboardButton(text="⬅️ Новее", callback_data=f"admin_bookings:newer:{first_id}"))
+    if has_older:
+        navigation.append(InlineKeyboardButton(text="Старее ➡️", callback_data=f"admin_bookings:older:{last_id}"))
+
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton(text="⬅️ Назад в админку", callback_data="admin_back_to_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
 # --- Admin Calendar/Time Slot Keyboards ---
 
-async def get_admin_calendar_keyboard(current_date: datetime.date, prefix: str) -> InlineKeyboardMarkup:
+async def get_admin_calendar_keyboard(
+        current_date: datetime.date,
+        prefix: str,
+        occupancy: Optional[Dict[datetime.date, DayOccupancy]] = None) -> InlineKeyboardMarkup:
     """
     Generates a calendar-like keyboard for admin to select a date.
     prefix: used for callback data, e.g., 'admin_add_slot_date'
+    occupancy: free/booked slot counts per date; days with slots are shown as "day·free/total"
     """
+    occupancy = occupancy or {}
     keyboard = []
     
     # Header with current month and year
@@ -71,7 +113,9 @@ async def get_admin_calendar_keyboard(current_date: datetime.date, prefix: str)
             row = []
         
         callback_data = f"{prefix}:select_day:{date_obj.isoformat()}"
-        row.append(InlineKeyboardButton(text=str(day), callback_data=callback_data))
+        day_load = occupancy.get(date_obj)
+        text = f"{day}·{day_load.free}/{day_load.free + day_load.booked}" if day_load else str(day)
+        row.append(InlineKeyboardButton(text=text, callback_data=callback_data))
     
     if row: # Add last row if not empty
         keyboard.append(row + [InlineKeyboardButton(text=" ", callback_data="ignore")] * (7 - len(row)))
@@ -81,21 +125,14 @@ async def get_admin_calendar_keyboard(current_date: datetime.date, prefix: str)
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-async def get_admin_time_slots_keyboard(selected_date: datetime.date, existing_slots: List[TimeSlot], prefix: str) -> InlineKeyboardMarkup:
+async def get_admin_time_slots_keyboard(selected_date: datetime.date, existing_times: Set[datetime.time], prefix: str) -> InlineKeyboardMarkup:
     """
-    Generates a keyboard with predefined time options for admin to add a slot.
+    Generates a keyboard with the configured time options for admin to add a slot.
     Shows existing slots as unavailable.
     """
     keyboard = []
     
-    # Predefined time options
-    times = [
-        datetime.time(9, 0), datetime.time(10, 0), datetime.time(11, 0), datetime.time(12, 0),
-        datetime.time(13, 0), datetime.time(14, 0), datetime.time(15, 0), datetime.time(16, 0),
-        datetime.time(17, 0), datetime.time(18, 0)
-    ]
-
-    existing_times = {slot.time for slot in existing_slots}
+    times = settings.admin_slot_times_list
 
     row = []
     for time_option in times:
@@ -6,11 +6,12 @@ from ..services.questionnaire_service import CachedQuestion
 
 def get_question_keyboard(
     question: CachedQuestion, 
-    selected_answers: List[str] = None
+    selected_answers: List[str] = None,
+    can_go_back: bool = True
 ) -> InlineKeyboardMarkup:
     """
     Generates a keyboard for a given cached question. This function is now synchronous
-    and does not require a database session.
+    and does not require a database session. The 'Back' button is left out on the first question.
     """
     if selected_answers is None:
         selected_answers = []
@@ -39,6 +40,7 @@ def get_question_keyboard(
         buttons.append([InlineKeyboardButton(text="Пропустить", callback_data=f"skip{question.id}")])
 
     # Add a 'Back' button for all types
-    buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="back")])
+    if can_go_back:
+        buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="back")])
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
\ No newline at end of file
@@ -1,6 +1,7 @@
 # VERSION 20: Definitive Fix
 print("---> RUNNING MAIN.PY VERSION 20 ---")
 import asyncio
+import datetime
 import logging
 from urllib.parse import urlparse
 import json
@@ -8,214 +9,229 @@ import json
 from aiogram import Bot, Dispatcher, types
 from aiogram.enums import ParseMode
 from aiogram.client.bot import DefaultBotProperties
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
-from aiohttp import web
-from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 from sqlalchemy.ext.asyncio import async_sessionmaker
-from yookassa.domain.notification import WebhookNotificationFactory, WebhookNotification
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.base import BaseStorage
 
 from .config import settings
-from .database.models import Base, Questionnaire, Question, QuestionLogic, User, Payment, Tariff
 from .database.session import create_session_maker
+from .database.schema import prepare_database
 from .handlers import start, tariff, questionnaire, booking, admin, payment_success
+from .middlewares.chat_lock import ChatSequenceMiddleware
 from .middlewares.db import DbSessionMiddleware
+from .middlewares.metrics import (
+    UpdateMetricsMiddleware, RoutingStartMiddleware, HandlerMetricsMiddleware, TelegramApiMetricsMiddleware,
+)
+from .middlewares.rate_limit import RateLimitMiddleware
+from .middlewares.tracing import TracingMiddleware, HandlerTracingMiddleware, TelegramApiTracingMiddleware
+from .services.metrics import (
+    registry as metrics_registry, StatsCollector, InstrumentedStorage,
+    instrument_engine, metrics_handler, start_metrics_server,
+)
 from .services.questionnaire_service import questionnaire_service
-
-# Import questionnaire data
-from .data.basic_questionnaire_data import options_data_basic, question_definitions_basic, logic_rules_definitions_basic
-from .data.ayurved_m_questionnaire_data import question_definitions_ayurved_m
-from .data.ayurved_j_questionnaire_data import question_definitions_ayurved_j
-
-
-async def _create_questionnaire_from_list(session, title, questions_list):
-    """Helper to create a questionnaire and its questions from a list."""
-    questionnaire = Questionnaire(title=title)
-    session.add(questionnaire)
-    await session.flush()
-
-    questions_to_add = []
-    logic_to_add = []
-    question_map = {}
-    prev_question = None
-
-    for q_def in questions_list:
-        q = Question(
-            questionnaire_id=questionnaire.id,
-            text=q_def['text'],
-            type=q_def['type'],
-            options=q_def.get('options')
+from .services import sql_profiler, tracing
+from .services.loop_watchdog import LoopWatchdog
+from .services.fsm_storage import ExpiringMemoryStorage
+from .services import maintenance
+from .services.scheduler import Scheduler
+from .services.job_queue import JobQueue
+
+
+def create_fsm_storage() -> BaseStorage:
+    """
+    Returns the FSM storage: Redis when configured (shared by all workers), in-memory otherwise.
+    Idle records expire after FSM_IDLE_TTL_HOURS: by Redis key TTL, or by the fsm_purge job.
+    """
+    if settings.REDIS_URL:
+        from aiogram.fsm.storage.redis import RedisStorage
+        ttl = datetime.timedelta(hours=settings.FSM_IDLE_TTL_HOURS)
+        return RedisStorage.from_url(settings.REDIS_URL, state_ttl=ttl, data_ttl=ttl)
+    return ExpiringMemoryStorage()
+
+
+async def init_database(session_maker: async_sessionmaker):
+    """ Migrates the schema and seeds the database unless the version table says both are current. """
+    async def seed():
+        # The questionnaire data is only needed on the first run
+        from .database.seed import seed_database
+        await seed_database(session_maker)
+
+    await prepare_database(session_maker.kw["bind"], seed)
+
+
+def create_scheduler(dp: Dispatcher, bot: Bot, session_maker: async_sessionmaker) -> Scheduler:
+    """
+    Registers the periodic jobs. Maintenance of the database runs in one process only,
+    the job queue is polled by every worker (claiming is safe to run concurrently).
+    """
+    scheduler = Scheduler()
+    job_queue = JobQueue(
+        session_maker, bot,
+        batch_size=settings.JOB_QUEUE_BATCH_SIZE,
+        concurrency=settings.JOB_QUEUE_CONCURRENCY,
+    )
+    scheduler.add_job("job_queue", settings.JOB_QUEUE_POLL_SECONDS, job_queue.run_due, run_at_start=True)
+    if settings.WORKER_INDEX in (None, 0):
+        scheduler.add_job(
+            "expire_payments", 10 * 60,
+            lambda: maintenance.expire_pending_payments(
+                session_maker, datetime.timedelta(hours=settings.PENDING_PAYMENT_TTL_HOURS)),
+            run_at_start=True,
         )
-        questions_to_add.append(q)
-    
-    session.add_all(questions_to_add)
-    await session.flush()
-
-    for i, q_def in enumerate(questions_list):
-        q = questions_to_add[i]
-        question_map[q_def['id']] = q
-
-        if prev_question:
-            logic = QuestionLogic(
-                question_id=prev_question.id,
-                answer_value='любой', 
-                next_question_id=q.id
-            )
-            logic_to_add.append(logic)
-        
-        prev_question = q
-            
-    if prev_question:
-        final_logic = QuestionLogic(
-            question_id=prev_question.id,
-            answer_value='любой',
-            next_question_id=None
+        scheduler.add_job(
+            "purge_old_data", 24 * 60 * 60,
+            lambda: maintenance.purge_old_data(session_maker, datetime.timedelta(days=settings.DATA_RETENTION_DAYS)),
         )
-        logic_to_add.append(final_logic)
 
-    session.add_all(logic_to_add)
-    return questionnaire
+    async def purge_fsm():
+        return maintenance.purge_idle_fsm(dp.storage, datetime.timedelta(hours=settings.FSM_IDLE_TTL_HOURS))
 
+    scheduler.add_job("fsm_purge", 30 * 60, purge_fsm)
+    return scheduler
 
-async def seed_database(session_maker: async_sessionmaker):
-    logging.info("Seeding database with new structure...")
-    async with session_maker() as session:
-        logging.info("Seeding 'basic' questionnaire...")
-        basic_questionnaire = Questionnaire(title="basic")
-        session.add(basic_questionnaire)
-        await session.flush()
-
-        question_id_map = {}
-        for q_def in question_definitions_basic:
-            q_options = options_data_basic.get(q_def['id'])
-            question = Question(
-                questionnaire_id=basic_questionnaire.id,
-                text=q_def['text'],
-                type=q_def['type'],
-                options=q_options
-            )
-            session.add(question)
-            await session.flush()
-            question_id_map[q_def['id']] = question.id
-
-        for rule_def in logic_rules_definitions_basic:
-            logic_rule = QuestionLogic(
-                question_id=question_id_map[rule_def['from_id']],
-                answer_value=rule_def['answer'],
-                next_question_id=question_id_map.get(rule_def['to_id'])
-            )
-            session.add(logic_rule)
-        await session.flush()
 
-        logging.info("Seeding 'ayurved_m' questionnaire...")
-        ayurved_m_questionnaire = await _create_questionnaire_from_list(
-            session, "ayurved_m", question_definitions_ayurved_m
-        )
-        logging.info("Seeding 'ayurved_j' questionnaire...")
-        ayurved_j_questionnaire = await _create_questionnaire_from_list(
-            session, "ayurved_j", question_definitions_ayurved_j
+def setup_dispatcher(bot: Bot, session_maker: async_sessionmaker) -> Dispatcher:
+    """
+    Builds the dispatcher with its storage, middlewares and routers, and installs
+    the outgoing request middlewares on the bot session.
+    """
+    rate_limiter = RateLimitMiddleware(
+        global_rate=settings.telegram_global_rate_per_process,
+        chat_rate=settings.TELEGRAM_CHAT_RATE,
+        chat_burst=settings.TELEGRAM_CHAT_BURST,
+        max_retries=settings.TELEGRAM_MAX_RETRIES,
+    )
+    bot.session.middleware(rate_limiter)
+
+    if settings.TRACING_ENABLED:
+        bot.session.middleware(TelegramApiTracingMiddleware())
+        tracing.instrument_engine(session_maker.kw["bind"])
+
+    storage = create_fsm_storage()
+    if settings.METRICS_ENABLED:
+        # Registered after the rate limiter, so API latency excludes time spent waiting for a token
+        bot.session.middleware(TelegramApiMetricsMiddleware())
+        metrics_registry.register(StatsCollector(
+            "bot_telegram_flood_control_total", "Outgoing request flood control events.", "event", rate_limiter.stats))
+        instrument_engine(session_maker.kw["bind"])
+        storage = InstrumentedStorage(storage)
+    dp = Dispatcher(storage=storage)
+
+    # Registered first, so the update span covers every other middleware
+    dp.update.outer_middleware(TracingMiddleware())
+    if settings.TRACING_ENABLED:
+        handler_tracing = HandlerTracingMiddleware()
+        dp.message.middleware(handler_tracing)
+        dp.callback_query.middleware(handler_tracing)
+    if settings.METRICS_ENABLED:
+        dp.update.outer_middleware(UpdateMetricsMiddleware())
+        handler_metrics = HandlerMetricsMiddleware()
+        dp.message.middleware(handler_metrics)
+        dp.callback_query.middleware(handler_metrics)
+    if settings.SQL_PROFILING:
+        sql_profiler.instrument_engine(session_maker.kw["bind"])
+        profiler = sql_profiler.SqlProfilerMiddleware(
+            slow_ms=settings.SQL_PROFILE_SLOW_MS,
+            max_statements=settings.SQL_PROFILE_MAX_STATEMENTS,
         )
+        dp.message.middleware(profiler)
+        dp.callback_query.middleware(profiler)
+    chat_sequence = ChatSequenceMiddleware()
+    dp.update.outer_middleware(chat_sequence)
+    dp["chat_sequence"] = chat_sequence
+    dp.update.middleware(DbSessionMiddleware(session_pool=session_maker))
+    if settings.METRICS_ENABLED:
+        dp.update.middleware(RoutingStartMiddleware())
 
-        logging.info("Seeding tariffs...")
-        tariffs_to_add = [
-            Tariff(title="Базовый", price=2500, description="Базовый тариф"),
-            Tariff(title="Сопровождение", price=5000, description="Тариф с сопровождением"),
-            Tariff(title="Повторная", price=2000, description="Повторная консультация"),
-            Tariff(title="Лайт", price=1500, description="Легкий тариф"),
-        ]
-        session.add_all(tariffs_to_add)
-        await session.flush()
-
-        from sqlalchemy import insert
-        tariff_questionnaires_table = Base.metadata.tables['tariff_questionnaires']
-        await session.execute(
-            insert(tariff_questionnaires_table),
-            [
-                {"tariff_id": tariffs_to_add[0].id, "questionnaire_id": basic_questionnaire.id},
-                {"tariff_id": tariffs_to_add[0].id, "questionnaire_id": ayurved_m_questionnaire.id},
-                {"tariff_id": tariffs_to_add[0].id, "questionnaire_id": ayurved_j_questionnaire.id},
-                {"tariff_id": tariffs_to_add[1].id, "questionnaire_id": basic_questionnaire.id},
-                {"tariff_id": tariffs_to_add[1].id, "questionnaire_id": ayurved_m_questionnaire.id},
-                {"tariff_id": tariffs_to_add[1].id, "questionnaire_id": ayurved_j_questionnaire.id},
-                {"tariff_id": tariffs_to_add[3].id, "questionnaire_id": ayurved_m_questionnaire.id},
-                {"tariff_id": tariffs_to_add[3].id, "questionnaire_id": ayurved_j_questionnaire.id},
-            ],
-        )
-        await session.commit()
-        logging.info("Tariffs and questionnaire links seeded.")
+    dp.include_router(start.router)
+    dp.include_router(tariff.router)
+    dp.include_router(questionnaire.router)
+    dp.include_router(booking.router)
+    dp.include_router(admin.router)
+    dp.include_router(payment_success.router)
+
+    return dp
 
 
 async def main():
     logging.basicConfig(
         level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        format="%(asctime)s - %(levelname)s - [%(correlation_id)s] %(name)s - %(message)s",
     )
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(tracing.CorrelationIdFilter())
+    if settings.TRACING_ENABLED:
+        tracing.tracer.configure(settings.TRACE_SAMPLE_RATE, settings.TRACE_EXPORT_PATH)
+        logging.info(f"Tracing {settings.TRACE_SAMPLE_RATE:.0%} of updates.")
     logging.info("Starting bot...")
 
     bot = Bot(token=settings.BOT_TOKEN.get_secret_value(), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher(storage=MemoryStorage())
-    
     session_maker = await create_session_maker()
 
-    dp.update.middleware(DbSessionMiddleware(session_pool=session_maker))
+    is_webhook_mode = bool(settings.WEBHOOK_HOST and settings.WEBHOOK_HOST.strip())
+    is_worker = settings.WORKER_INDEX is not None
+
+    if is_webhook_mode and settings.WEB_WORKERS > 1 and not is_worker:
+        # Front process: prepares the database once, then only dispatches requests to the workers
+        if not settings.REDIS_URL:
+            logging.warning("REDIS_URL is not set: FSM state is kept per worker and lost when a worker restarts.")
+        await init_database(session_maker)
+        await bot.set_webhook(url=settings.WEBHOOK_URL, drop_pending_updates=True)
+        logging.info(f"Webhook set to {settings.WEBHOOK_URL}")
+        await bot.session.close()
+        from .workers import WebhookFront
+        await WebhookFront(settings.WEB_WORKERS, settings.WORKER_BASE_PORT).run(urlparse(settings.WEBHOOK_URL).path)
+        return
 
-    dp.include_router(start.router)
-    dp.include_router(tariff.router)
-    dp.include_router(questionnaire.router)
-    dp.include_router(booking.router)
-    dp.include_router(admin.router)
-    dp.include_router(payment_success.router)
+    dp = setup_dispatcher(bot, session_maker)
+    if settings.LOOP_WATCHDOG_ENABLED:
+        LoopWatchdog(
+            threshold=settings.LOOP_LAG_THRESHOLD_MS / 1000,
+            slow_callback_debug=settings.LOOP_SLOW_CALLBACK_DEBUG,
+        ).start()
 
-    engine = session_maker.kw["bind"]
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        result = await conn.execute(select(User).limit(1))
-        if result.scalar_one_or_none() is None:
-            await seed_database(session_maker)
-        else:
-            logging.info("Database already contains data, skipping seeding.")
+    if not is_worker:
+        await init_database(session_maker)
 
     async with session_maker() as session:
         await questionnaire_service.load_from_db(session)
     logging.info("Questionnaire cache loaded.")
 
-    is_webhook_mode = bool(settings.WEBHOOK_HOST and settings.WEBHOOK_HOST.strip())
+    if settings.SCHEDULER_ENABLED:
+        create_scheduler(dp, bot, session_maker).start()
 
     if is_webhook_mode:
-        await bot.set_webhook(
-            url=settings.WEBHOOK_URL,
-            drop_pending_updates=True
-        )
-        logging.info(f"Webhook set to {settings.WEBHOOK_URL}")
+        # The webhook server is not needed in polling mode
+        from aiohttp import web
+        from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+        if is_worker:
+            # The front process owns the webhook and the public port
+            host, port = "127.0.0.1", settings.WORKER_BASE_PORT + settings.WORKER_INDEX
+            logging.info(f"Running as webhook worker {settings.WORKER_INDEX}.")
+        else:
+            host, port = settings.WEB_SERVER_HOST, settings.WEB_SERVER_PORT
+            await bot.set_webhook(
+                url=settings.WEBHOOK_URL,
+                drop_pending_updates=True
+            )
+            logging.info(f"Webhook set to {settings.WEBHOOK_URL}")
 
         async def yookassa_webhook_handler(request):
             notification_body = await request.json()
-            notification = WebhookNotificationFactory().create(notification_body)
-            if notification.event == 'payment.succeeded':
-                payment_id = notification.object.id
-                async with session_maker() as session:
-                    result = await session.execute(
-                        select(Payment).options(joinedload(Payment.user)).filter_by(yookassa_id=payment_id)
-                    )
-                    payment = result.scalar_one_or_none()
-
-                    if payment and payment.user:
-                        payment.status = 'succeeded'
-                        await session.commit()
-                        await payment_success.on_payment_success(bot, session, dp, payment)
-                    else:
-                        logging.warning(f"Payment with yookassa_id {payment_id} or its user not found.")
-                return web.Response(status=200)
-            return web.Response(status=400)
+            with tracing.tracer.update_span("yookassa.notification", event=notification_body.get("event")):
+                processed = await payment_success.process_yookassa_notification(bot, dp, session_maker, notification_body)
+            return web.Response(status=200 if processed else 400)
         
         app = web.Application()
         app.router.add_post(urlparse(settings.WEBHOOK_URL).path, SimpleRequestHandler(dispatcher=dp, bot=bot))
         app.router.add_post("/yookassa_webhook", yookassa_webhook_handler)
+        if settings.METRICS_ENABLED:
+            app.router.add_get("/metrics", metrics_handler)
 
         runner = web.AppRunner(app)
         await runner.setup()
-        site = web.TCPSite(runner, host=settings.WEB_SERVER_HOST, port=settings.WEB_SERVER_PORT)
+        site = web.TCPSite(runner, host=host, port=port)
         await site.start()
         
         await asyncio.Event().wait()
@@ -223,6 +239,9 @@ async def main():
     else:
         await bot.delete_webhook(drop_pending_updates=True)
         logging.info("Running in long-polling mode.")
+        if settings.METRICS_ENABLED:
+            await start_metrics_server(settings.WEB_SERVER_HOST, settings.METRICS_PORT)
+            logging.info(f"Metrics available on port {settings.METRICS_PORT} at /metrics.")
         await dp.start_polling(bot)
 
 
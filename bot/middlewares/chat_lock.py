@@ -0,0 +1,61 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Any, Awaitable, Optional, Tuple
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class ChatSequenceMiddleware(BaseMiddleware):
+    """
+    Serializes updates of the same chat while different chats are processed in parallel.
+    A lock lives only while updates for its chat are waiting or running, so memory stays
+    proportional to the number of currently active chats.
+    """
+    def __init__(self):
+        super().__init__()
+        self._locks: Dict[Tuple[int, int], Tuple[asyncio.Lock, int]] = {}
+
+    @staticmethod
+    def _get_key(data: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        if chat is None and user is None:
+            return None
+        return (chat.id if chat else user.id, user.id if user else chat.id)
+
+    @asynccontextmanager
+    async def serialized(self, chat_id: int, user_id: int):
+        """
+        Holds the lock of a chat. Also used outside of the dispatcher, e.g. by payment notifications.
+        """
+        key = (chat_id, user_id)
+        lock, waiters = self._locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[key] = (lock, waiters + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, waiters = self._locks[key]
+            if waiters <= 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, waiters - 1)
+
+    @property
+    def active_chats(self) -> int:
+        return len(self._locks)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        key = self._get_key(data)
+        if key is None:
+            return await handler(event, data)
+
+        async with self.serialized(*key):
+            return await handler(event, data)
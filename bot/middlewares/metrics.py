@@ -0,0 +1,111 @@
+import time
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from ..services.metrics import (
+    current_handler,
+    UPDATES_TOTAL,
+    UPDATE_DURATION,
+    ROUTER_FILTER_DURATION,
+    TELEGRAM_API_DURATION,
+    TELEGRAM_API_ERRORS,
+)
+
+# Error classes without a status code of their own
+_ERROR_CODES = {
+    "TelegramBadRequest": "400",
+    "TelegramUnauthorizedError": "401",
+    "TelegramForbiddenError": "403",
+    "TelegramNotFound": "404",
+    "TelegramConflictError": "409",
+    "TelegramEntityTooLarge": "413",
+    "TelegramServerError": "5xx",
+}
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Outer update middleware: counts updates and measures their full processing time per handler.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        token = current_handler.set("unhandled")
+        started_at = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_name = current_handler.get()
+            UPDATES_TOTAL.inc(handler_name)
+            UPDATE_DURATION.observe(time.perf_counter() - started_at, handler_name)
+            current_handler.reset(token)
+
+
+class RoutingStartMiddleware(BaseMiddleware):
+    """
+    Inner update middleware registered last: marks the moment routing starts, after the chat
+    lock is held and the database session is open, for HandlerMetricsMiddleware.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        data["routing_started_at"] = time.perf_counter()
+        return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner event middleware: runs once the router has picked a handler, so it knows the handler
+    name and how long the router filters took to get there (see RoutingStartMiddleware).
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        started_at = data.get("routing_started_at")
+        if started_at is not None:
+            ROUTER_FILTER_DURATION.observe(time.perf_counter() - started_at)
+        handler_object = data.get("handler")
+        if handler_object is not None:
+            current_handler.set(getattr(handler_object.callback, "__name__", "unknown"))
+        return await handler(event, data)
+
+
+class TelegramApiMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Outgoing request middleware: measures Bot API latency and counts errors per method and code.
+    """
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        api_method = method.__api_method__
+        started_at = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            TELEGRAM_API_ERRORS.inc(api_method, "429")
+            raise
+        except TelegramNetworkError:
+            TELEGRAM_API_ERRORS.inc(api_method, "network")
+            raise
+        except TelegramAPIError as e:
+            TELEGRAM_API_ERRORS.inc(api_method, _ERROR_CODES.get(type(e).__name__, "other"))
+            raise
+        finally:
+            TELEGRAM_API_DURATION.observe(time.perf_counter() - started_at, api_method)
@@ -0,0 +1,136 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+_low_priority = contextvars.ContextVar("telegram_low_priority", default=False)
+
+
+@contextmanager
+def low_priority() -> Iterator[None]:
+    """ Requests sent inside the block (and tasks started from it) yield to user-facing requests. """
+    token = _low_priority.set(True)
+    try:
+        yield
+    finally:
+        _low_priority.reset(token)
+
+
+class TokenBucket:
+    """A classic token bucket: `rate` tokens per second, at most `capacity` stored."""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Outgoing request middleware that keeps the bot within Telegram's flood limits.
+    Requests to a chat pass a per-chat and a global token bucket; low-priority requests
+    (admin notifications, see low_priority()) wait while user-facing requests are queued.
+    429 responses are retried after the `retry_after` delay sent by Telegram.
+    """
+    def __init__(
+        self,
+        global_rate: float,
+        chat_rate: float,
+        chat_burst: int,
+        max_retries: int,
+        max_tracked_chats: int = 10000,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_tracked_chats = max_tracked_chats
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._high_priority_waiting = 0
+        self.stats: Dict[str, int] = {"requests": 0, "throttled": 0, "retries": 0, "retry_exhausted": 0}
+
+    def _get_chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+            if len(self._chats) > self.max_tracked_chats:
+                # Idle chats have full buckets, so dropping them does not change behaviour
+                for key in [key for key, b in self._chats.items() if key != chat_id and b.is_full][: len(self._chats) // 2]:
+                    del self._chats[key]
+        return bucket
+
+    async def _acquire(self, chat_id: Any):
+        chat_bucket = self._get_chat_bucket(chat_id)
+        is_high_priority = not _low_priority.get()
+        waiting = False
+        try:
+            while True:
+                delay = max(chat_bucket.wait_time(), self._global.wait_time())
+                if not is_high_priority and self._high_priority_waiting:
+                    delay = max(delay, 1 / self._global.rate)
+                if delay <= 0:
+                    chat_bucket.take()
+                    self._global.take()
+                    return
+                if not waiting:
+                    waiting = True
+                    self.stats["throttled"] += 1
+                    if is_high_priority:
+                        self._high_priority_waiting += 1
+                await asyncio.sleep(delay)
+        finally:
+            if waiting and is_high_priority:
+                self._high_priority_waiting -= 1
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        chat_id: Optional[Any] = getattr(method, "chat_id", None)
+        self.stats["requests"] += 1
+
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await self._acquire(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    self.stats["retry_exhausted"] += 1
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                logging.warning(f"Flood control on {method.__api_method__} for chat {chat_id}, retrying in {e.retry_after}s.")
+                await asyncio.sleep(e.retry_after)
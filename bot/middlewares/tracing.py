@@ -0,0 +1,59 @@
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from ..services.tracing import tracer
+
+
+class TracingMiddleware(BaseMiddleware):
+    """
+    Outer update middleware: opens the root span of an update and sets its correlation id.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        attributes = {}
+        if isinstance(event, Update):
+            attributes["update_id"] = event.update_id
+            attributes["event_type"] = event.event_type
+        user = data.get("event_from_user")
+        if user is not None:
+            attributes["user_id"] = user.id
+        with tracer.update_span("update", **attributes):
+            return await handler(event, data)
+
+
+class HandlerTracingMiddleware(BaseMiddleware):
+    """
+    Inner event middleware: labels the update span with the handler the router has picked.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        if handler_object is not None:
+            tracer.set_attribute("handler", getattr(handler_object.callback, "__name__", "unknown"))
+        return await handler(event, data)
+
+
+class TelegramApiTracingMiddleware(BaseRequestMiddleware):
+    """
+    Outgoing request middleware: records a span for every Bot API call of a sampled update.
+    """
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        with tracer.span(f"telegram.{method.__api_method__}"):
+            return await make_request(bot, method)
@@ -0,0 +1,73 @@
+import datetime
+from typing import List, NamedTuple, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import Booking, TimeSlot, User
+
+BOOKINGS_PAGE_SIZE = 10
+
+
+class BookingRow(NamedTuple):
+    """The columns shown in the admin bookings list."""
+    id: int
+    status: str
+    username: Optional[str]
+    telegram_id: int
+    date: datetime.date
+    time: datetime.time
+
+
+class BookingsPage(NamedTuple):
+    rows: List[BookingRow]
+    has_older: bool
+    has_newer: bool
+
+
+async def get_bookings_page(
+        session: AsyncSession,
+        older_than: Optional[int] = None,
+        newer_than: Optional[int] = None,
+        page_size: int = BOOKINGS_PAGE_SIZE) -> BookingsPage:
+    """
+    Returns one page of bookings, newest first, using keyset pagination on the booking id:
+    the cost of a page does not depend on how many bookings exist before it.
+    Without a cursor the newest page is returned.
+    """
+    query = (
+        select(Booking.id, Booking.status, User.username, User.telegram_id, TimeSlot.date, TimeSlot.time)
+        .join(User, Booking.user_id == User.id)
+        .join(TimeSlot, Booking.slot_id == TimeSlot.id)
+        .limit(page_size + 1)  # one extra row tells whether there is a next page
+    )
+    if newer_than is not None:
+        query = query.where(Booking.id > newer_than).order_by(Booking.id.asc())
+    else:
+        if older_than is not None:
+            query = query.where(Booking.id < older_than)
+        query = query.order_by(Booking.id.desc())
+
+    rows: List[Tuple] = (await session.execute(query)).all()
+    has_more = len(rows) > page_size
+    rows = [BookingRow(*row) for row in rows[:page_size]]
+
+    if newer_than is not None:
+        rows.reverse()
+        return BookingsPage(rows, has_older=True, has_newer=has_more)
+    return BookingsPage(rows, has_older=has_more, has_newer=older_than is not None)
+
+
+def format_bookings_page(page: BookingsPage) -> str:
+    """ Renders a page of bookings; a full page stays well under the Telegram message limit. """
+    response_text = "<b>Активные записи:</b>\n\n"
+    for booking in page.rows:
+        user_info = f"@{booking.username}" if booking.username else f"ID: {booking.telegram_id}"
+        response_text += (
+            f"Запись №{booking.id}\n"
+            f"Пользователь: {user_info}\n"
+            f"Дата: {booking.date.strftime('%Y-%m-%d')}\n"
+            f"Время: {booking.time.strftime('%H:%M')}\n"
+            f"Статус: {booking.status}\n"
+            "----------------------------\n"
+        )
+    return response_text
@@ -0,0 +1,181 @@
+import csv
+import datetime
+import json
+from typing import Any, AsyncIterator, Dict, Mapping, TextIO
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database.models import Answer, QuestionnaireResult, User
+from ..database.session import dialect_insert
+from .questionnaire_service import QuestionnaireCache, QuestionnaireService
+
+EXPORT_FORMATS = ("csv", "jsonl")
+EXPORT_COLUMNS = ("answer_id", "telegram_id", "username", "questionnaire", "question_id", "question", "answer", "photo_file_id")
+
+# Rows fetched from the server-side cursor at a time
+EXPORT_BATCH_SIZE = 1000
+
+
+def _decode_answer(question_type: str, answer_value: Any) -> Any:
+    """ Multi-choice answers are kept in FSM data as JSON strings; documents store the list. """
+    if question_type == "multi" and isinstance(answer_value, str):
+        try:
+            return json.loads(answer_value)
+        except json.JSONDecodeError:
+            pass
+    return answer_value
+
+
+async def record_answer(session: AsyncSession, telegram_id: int, questionnaire_title: str, question_id: int, answer_value: Any):
+    """
+    Merges one answer into the user's questionnaire_results document with a single upsert,
+    without reading the document. Does not commit.
+    """
+    statement = dialect_insert(session, QuestionnaireResult).values(
+        user_id=select(User.id).where(User.telegram_id == telegram_id).scalar_subquery(),
+        questionnaire_title=questionnaire_title,
+        answers={str(question_id): answer_value},
+        completed=False,
+        updated_at=datetime.datetime.utcnow(),
+    )
+    if session.bind.dialect.name == "postgresql":
+        merged = QuestionnaireResult.answers.op("||")(statement.excluded.answers)
+    else:
+        merged = func.json_patch(QuestionnaireResult.answers, statement.excluded.answers)
+    await session.execute(statement.on_conflict_do_update(
+        index_elements=["user_id", "questionnaire_title"],
+        set_={"answers": merged, "completed": False, "updated_at": statement.excluded.updated_at},
+    ))
+
+
+async def _save_result_document(session: AsyncSession, user_id: int, questionnaire_title: str, document: Dict[str, Any]):
+    """ Replaces the document with the final answers, dropping answers to branches no longer taken. """
+    statement = dialect_insert(session, QuestionnaireResult).values(
+        user_id=user_id,
+        questionnaire_title=questionnaire_title,
+        answers=document,
+        completed=True,
+        updated_at=datetime.datetime.utcnow(),
+    )
+    await session.execute(statement.on_conflict_do_update(
+        index_elements=["user_id", "questionnaire_title"],
+        set_={"answers": statement.excluded.answers, "completed": True, "updated_at": statement.excluded.updated_at},
+    ))
+
+
+async def save_questionnaire_answers(
+        session: AsyncSession,
+        user_id: int,
+        questionnaire_title: str,
+        q_cache: QuestionnaireCache,
+        answers: Mapping[str, Any]) -> int:
+    """
+    Stores the answers to one questionnaire from FSM data in one bulk insert, replacing the
+    user's earlier answers to the same questions, and completes the questionnaire_results
+    document. Returns how many answers were stored. Does not commit.
+    """
+    rows = []
+    document = {}
+    for q_id_str, answer_value in answers.items():
+        question = q_cache.get_question(int(q_id_str))
+        if not question:
+            continue
+        document[q_id_str] = _decode_answer(question.type, answer_value)
+        if question.type == "photo":
+            photo = answer_value if answer_value and answer_value != "skipped" else None
+            rows.append({"user_id": user_id, "question_id": question.id, "answer_text": None, "photo_file_id": photo})
+        else:
+            rows.append({"user_id": user_id, "question_id": question.id, "answer_text": answer_value, "photo_file_id": None})
+    if not rows:
+        return 0
+    await session.execute(
+        delete(Answer).where(Answer.user_id == user_id, Answer.question_id.in_([row["question_id"] for row in rows]))
+    )
+    await session.execute(insert(Answer), rows)
+    if settings.QUESTIONNAIRE_RESULTS_ENABLED:
+        await _save_result_document(session, user_id, questionnaire_title, document)
+    return len(rows)
+
+
+async def iter_answer_rows(session: AsyncSession, questionnaire_service: QuestionnaireService) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams every stored answer with the question text from the questionnaire cache.
+    Rows come from a server-side cursor in batches, so memory does not grow with the history.
+    """
+    result = await session.stream(
+        select(Answer.id, User.telegram_id, User.username, Answer.question_id, Answer.answer_text, Answer.photo_file_id)
+        .join(User, Answer.user_id == User.id)
+        .order_by(Answer.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    async for answer_id, telegram_id, username, question_id, answer_text, photo_file_id in result:
+        question = questionnaire_service.get_question(question_id)
+        answer = _decode_answer(question.type, answer_text) if question else answer_text
+        yield {
+            "answer_id": answer_id,
+            "telegram_id": telegram_id,
+            "username": username,
+            "questionnaire": questionnaire_service.get_questionnaire_title(question_id),
+            "question_id": question_id,
+            "question": question.text if question else None,
+            "answer": answer,
+            "photo_file_id": photo_file_id,
+        }
+
+
+async def export_answers(session: AsyncSession, questionnaire_service: QuestionnaireService, out: TextIO, export_format: str) -> int:
+    """ Writes all answers to `out` as CSV or JSON Lines, row by row. Returns the number of rows. """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    writer = csv.DictWriter(out, fieldnames=EXPORT_COLUMNS) if export_format == "csv" else None
+    if writer:
+        writer.writeheader()
+    count = 0
+    async for row in iter_answer_rows(session, questionnaire_service):
+        if writer:
+            if isinstance(row["answer"], list):
+                row["answer"] = ", ".join(row["answer"])
+            writer.writerow(row)
+        else:
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+async def iter_result_documents(session: AsyncSession, questionnaire_service: QuestionnaireService) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams one document per user and questionnaire from questionnaire_results, with the
+    answers keyed by question text instead of id.
+    """
+    result = await session.stream(
+        select(
+            User.telegram_id, User.username, QuestionnaireResult.questionnaire_title,
+            QuestionnaireResult.completed, QuestionnaireResult.updated_at, QuestionnaireResult.answers,
+        )
+        .join(User, QuestionnaireResult.user_id == User.id)
+        .order_by(QuestionnaireResult.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    async for telegram_id, username, title, completed, updated_at, answers in result:
+        named = {}
+        for q_id_str, answer in answers.items():
+            question = questionnaire_service.get_question(int(q_id_str))
+            named[question.text if question else q_id_str] = answer
+        yield {
+            "telegram_id": telegram_id,
+            "username": username,
+            "questionnaire": title,
+            "completed": completed,
+            "updated_at": updated_at.isoformat() if updated_at else None,
+            "answers": named,
+        }
+
+
+async def export_result_documents(session: AsyncSession, questionnaire_service: QuestionnaireService, out: TextIO) -> int:
+    """ Writes the questionnaire_results documents to `out` as JSON Lines. Returns the number of documents. """
+    count = 0
+    async for document in iter_result_documents(session, questionnaire_service):
+        out.write(json.dumps(document, ensure_ascii=False) + "\n")
+        count += 1
+    return count
@@ -0,0 +1,87 @@
+import html
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .questionnaire_service import CachedQuestion, QuestionnaireService
+
+# Telegram rejects longer messages
+MESSAGE_LIMIT = 4096
+
+# FSM data: {question id: [formatted line, photo file id or None]}, in the order of answering
+Summary = Dict[str, List[Optional[str]]]
+
+
+def format_answer_line(question: CachedQuestion, answer_value: Any) -> Tuple[str, Optional[str]]:
+    """
+    Formats one answer for the admin notification (HTML-escaped, the bot uses HTML parse mode).
+    Returns the line and the file id of a photo to send separately.
+    """
+    text = html.escape(question.text)
+    if question.type == "photo":
+        if answer_value and answer_value != "skipped":
+            return f"- {text}: [Фото приложено ниже]", answer_value
+        return f"- {text}: Пропущено", None
+    if question.type == "multi":
+        if isinstance(answer_value, str):
+            try:
+                answer_value = json.loads(answer_value)
+            except json.JSONDecodeError:
+                return f"- {text}: {html.escape(answer_value)} (некорректный формат multi-ответа)", None
+        return f"- {text}: {html.escape(', '.join(answer_value))}", None
+    return f"- {text}: {html.escape(str(answer_value))}", None
+
+
+def add_to_summary(summary: Summary, question: CachedQuestion, answer_value: Any) -> Summary:
+    """ Records the formatted line of an answer in place; answering a question again replaces its line. """
+    summary[str(question.id)] = list(format_answer_line(question, answer_value))
+    return summary
+
+
+def render_summary(summary: Summary, questionnaire_service: QuestionnaireService) -> Tuple[List[str], List[str]]:
+    """
+    Returns the stored lines, with a heading before the answers of every questionnaire,
+    and the photo file ids.
+    """
+    lines = []
+    photo_file_ids = []
+    current_title = None
+    for q_id_str, (line, photo_file_id) in summary.items():
+        title = questionnaire_service.get_questionnaire_title(int(q_id_str))
+        if title != current_title:
+            lines.append(f"<b>{html.escape(title or '')}</b>")
+            current_title = title
+        lines.append(line)
+        if photo_file_id:
+            photo_file_ids.append(photo_file_id)
+    return lines, photo_file_ids
+
+
+def _split_long_line(line: str, limit: int) -> Iterable[str]:
+    while len(line) > limit:
+        cut = limit
+        # Do not cut an HTML entity such as &quot; in half
+        amp = line.rfind("&", max(0, limit - 8), limit)
+        if amp > 0 and ";" not in line[amp:limit]:
+            cut = amp
+        yield line[:cut]
+        line = line[cut:]
+    yield line
+
+
+def split_message(lines: Iterable[str], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """ Packs lines into as few messages as possible, each at most `limit` characters long. """
+    messages = []
+    current: List[str] = []
+    size = 0
+    for long_line in lines:
+        for line in _split_long_line(long_line, limit):
+            added = len(line) + (1 if current else 0)
+            if current and size + added > limit:
+                messages.append("\n".join(current))
+                current, size = [], 0
+                added = len(line)
+            current.append(line)
+            size += added
+    if current:
+        messages.append("\n".join(current))
+    return messages
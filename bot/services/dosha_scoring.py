@@ -0,0 +1,94 @@
+from typing import TYPE_CHECKING, Dict, List, Mapping, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from .questionnaire_service import QuestionnaireCache
+
+DOSHAS = ("Вата", "Питта", "Капха")
+
+# Questionnaires in bot/data where the options of every question are ordered Vata, Pitta, Kapha
+SCORED_QUESTIONNAIRES = ("ayurved_m", "ayurved_j")
+
+Vector = Tuple[int, ...]
+
+
+def _unit(index: int) -> Vector:
+    return tuple(int(i == index) for i in range(len(DOSHAS)))
+
+
+def _add(scores: Sequence[int], weights: Vector, sign: int = 1) -> List[int]:
+    return [score + sign * weight for score, weight in zip(scores, weights)]
+
+
+class DoshaScorer:
+    """
+    Weight vectors of the answer options, compiled once from the loaded questionnaires.
+    Scores are kept as a running vector per questionnaire in FSM data, so recording an
+    answer costs one lookup and one vector addition instead of rescanning all answers.
+    """
+    def __init__(self):
+        self._weights: Dict[int, Dict[str, Vector]] = {}
+        self._titles: Dict[int, str] = {}
+
+    def compile(self, caches: Mapping[str, "QuestionnaireCache"]):
+        self._weights.clear()
+        self._titles.clear()
+        for title in SCORED_QUESTIONNAIRES:
+            cache = caches.get(title)
+            if not cache:
+                continue
+            for question in cache.questions.values():
+                if question.type != "single" or len(question.options) != len(DOSHAS):
+                    continue
+                self._weights[question.id] = {option: _unit(index) for index, option in enumerate(question.options)}
+                self._titles[question.id] = title
+
+    def is_scored(self, question_id: int) -> bool:
+        return question_id in self._weights
+
+    def apply(
+            self,
+            scores: Dict[str, List[int]],
+            question_id: int,
+            answer: str,
+            previous_answer: Optional[str] = None) -> Dict[str, List[int]]:
+        """
+        Adds the weights of an answer to the scores of its questionnaire, taking back the
+        previous answer to the same question if there was one. Returns the updated scores.
+        """
+        options = self._weights.get(question_id)
+        if options is None:
+            return scores
+        title = self._titles[question_id]
+        vector = scores.get(title) or [0] * len(DOSHAS)
+        if previous_answer in options:
+            vector = _add(vector, options[previous_answer], -1)
+        if answer in options:
+            vector = _add(vector, options[answer])
+        return {**scores, title: vector}
+
+    def retract(self, scores: Dict[str, List[int]], question_id: int, answer: str) -> Dict[str, List[int]]:
+        """ Takes an answer back out of the scores, e.g. when the user goes back. """
+        options = self._weights.get(question_id)
+        if options is None or answer not in options or self._titles[question_id] not in scores:
+            return scores
+        title = self._titles[question_id]
+        return {**scores, title: _add(scores[title], options[answer], -1)}
+
+
+def format_dosha_scores(scores: Mapping[str, Sequence[int]]) -> str:
+    """ One line per scored questionnaire: points and share of every dosha, the leading one in bold. """
+    lines = []
+    for title, vector in scores.items():
+        total = sum(vector)
+        if not total:
+            continue
+        leading = max(vector)
+        parts = [
+            (f"<b>{dosha}</b>" if points == leading else dosha) + f" {points} ({points / total:.0%})"
+            for dosha, points in zip(DOSHAS, vector)
+        ]
+        lines.append(f"{title}: " + ", ".join(parts))
+    return "\n".join(lines)
+
+
+dosha_scorer = DoshaScorer()
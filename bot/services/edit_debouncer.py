@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup
+
+from ..config import settings
+from ..middlewares.chat_lock import ChatSequenceMiddleware
+from .render_cache import render_cache
+
+
+class MessageEditDebouncer:
+    """
+    Coalesces keyboard edits of the same message made within a short window.
+    Only the latest keyboard is sent, with at most one edit_message_reply_markup call.
+    With a chat_sequence the edit is sent under the chat lock, so a handler that replaces
+    the message and cancels the edit (done, back) can't be overtaken by it.
+    """
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._pending: Dict[Tuple[int, int], InlineKeyboardMarkup] = {}
+        self._tasks: Dict[Tuple[int, int], asyncio.Task] = {}
+
+    def schedule(
+        self, bot: Bot, chat_id: int, message_id: int, reply_markup: InlineKeyboardMarkup,
+        chat_sequence: Optional[ChatSequenceMiddleware] = None
+    ):
+        key = (chat_id, message_id)
+        self._pending[key] = reply_markup
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._flush_later(bot, key, chat_sequence))
+
+    def cancel(self, chat_id: int, message_id: int):
+        """ Drops a pending edit, e.g. when the message is about to be replaced anyway. """
+        key = (chat_id, message_id)
+        self._pending.pop(key, None)
+        task = self._tasks.pop(key, None)
+        if task:
+            task.cancel()
+
+    async def _flush_later(self, bot: Bot, key: Tuple[int, int], chat_sequence: Optional[ChatSequenceMiddleware]):
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            # After cancel() a newer task may already be registered under the same key
+            if self._tasks.get(key) is asyncio.current_task():
+                del self._tasks[key]
+
+        if chat_sequence is None:
+            await self._flush(bot, key)
+            return
+        chat_id, _ = key
+        # From here on cancel() can't stop the task, so the pending edit is checked again under the lock
+        async with chat_sequence.serialized(chat_id, chat_id):
+            await self._flush(bot, key)
+
+    async def _flush(self, bot: Bot, key: Tuple[int, int]):
+        reply_markup = self._pending.pop(key, None)
+        if reply_markup is None:
+            return
+        chat_id, message_id = key
+        try:
+            await render_cache.render_markup(bot, chat_id, message_id, reply_markup)
+        except TelegramBadRequest as e:
+            logging.warning(f"Debounced keyboard edit for chat {chat_id} failed: {e}")
+
+
+edit_debouncer = MessageEditDebouncer(settings.MULTI_SELECT_DEBOUNCE_SECONDS)
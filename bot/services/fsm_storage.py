@@ -0,0 +1,43 @@
+import time
+from typing import Any, Dict, Mapping, Optional
+from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+
+class ExpiringMemoryStorage(MemoryStorage):
+    """
+    In-memory FSM storage that remembers when each key was last used, so state and data of
+    users who abandoned a flow can be purged instead of staying in memory forever.
+    """
+    def __init__(self):
+        super().__init__()
+        self.last_used: Dict[StorageKey, float] = {}
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self.last_used[key] = time.monotonic()
+        await super().set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        self.last_used[key] = time.monotonic()
+        return await super().get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        self.last_used[key] = time.monotonic()
+        await super().set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        self.last_used[key] = time.monotonic()
+        return await super().get_data(key)
+
+    async def get_value(self, storage_key: StorageKey, dict_key: str, default: Optional[Any] = None) -> Optional[Any]:
+        self.last_used[storage_key] = time.monotonic()
+        return await super().get_value(storage_key, dict_key, default)
+
+    def purge_idle(self, ttl: float) -> int:
+        """ Drops the records not used for `ttl` seconds. Returns how many were dropped. """
+        deadline = time.monotonic() - ttl
+        idle = [key for key, used_at in self.last_used.items() if used_at < deadline]
+        for key in idle:
+            del self.last_used[key]
+            self.storage.pop(key, None)
+        return len(idle)
@@ -0,0 +1,203 @@
+import asyncio
+import datetime
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Set, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramServerError
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from ..database.models import Booking, ScheduledJob
+from ..database.session import dialect_insert
+
+JobHandler = Callable[[Bot, Dict[str, Any]], Awaitable[None]]
+# Returns the ids of claimed jobs that must not run any more
+JobValidator = Callable[[AsyncSession, Sequence[ScheduledJob]], Awaitable[Set[int]]]
+
+REMINDER_OFFSETS = {"24h": datetime.timedelta(hours=24), "1h": datetime.timedelta(hours=1)}
+
+# Errors after which Telegram has certainly not delivered the message, so a retry cannot double-send
+_RETRYABLE_ERRORS = (TelegramRetryAfter, TelegramServerError)
+
+
+async def enqueue(session: AsyncSession, kind: str, run_at: datetime.datetime, payload: Dict[str, Any], dedupe_key: str) -> bool:
+    """
+    Adds a job unless one with the same dedupe key exists. Returns whether it was added. Does not commit.
+    """
+    result = await session.execute(
+        dialect_insert(session, ScheduledJob)
+        .values(kind=kind, run_at=run_at, payload=payload, dedupe_key=dedupe_key, status="pending", attempts=0)
+        .on_conflict_do_nothing(index_elements=["dedupe_key"])
+    )
+    return bool(result.rowcount)
+
+
+async def enqueue_booking_reminders(session: AsyncSession, booking_id: int, chat_id: int, starts_at: datetime.datetime) -> int:
+    """ Schedules the reminders of a booking that are still in the future. Does not commit. """
+    now = datetime.datetime.now()
+    added = 0
+    for label, offset in REMINDER_OFFSETS.items():
+        run_at = starts_at - offset
+        if run_at <= now:
+            continue
+        payload = {"chat_id": chat_id, "booking_id": booking_id, "starts_at": starts_at.isoformat(), "label": label}
+        added += await enqueue(session, "booking_reminder", run_at, payload, f"booking_reminder:{booking_id}:{label}")
+    return added
+
+
+async def cancel_booking_reminders(session: AsyncSession, booking_id: int):
+    """ Drops the pending reminders of a booking, e.g. when it is canceled. Does not commit. """
+    await session.execute(
+        delete(ScheduledJob).where(
+            ScheduledJob.status == "pending",
+            ScheduledJob.dedupe_key.in_([f"booking_reminder:{booking_id}:{label}" for label in REMINDER_OFFSETS]),
+        )
+    )
+
+
+def reminder_deadline(payload: Dict[str, Any]) -> datetime.datetime:
+    """ A reminder is pointless once the next, closer one is due, and the last one once the consultation starts. """
+    starts_at = datetime.datetime.fromisoformat(payload["starts_at"])
+    closer = [offset for offset in REMINDER_OFFSETS.values() if offset < REMINDER_OFFSETS[payload["label"]]]
+    return starts_at - max(closer, default=datetime.timedelta(0))
+
+
+async def invalid_booking_reminders(session: AsyncSession, jobs: Sequence[ScheduledJob]) -> Set[int]:
+    """
+    Reminders claimed late (after downtime or retries) past their send window, and reminders
+    of bookings that no longer exist or are not confirmed. One query per batch.
+    """
+    now = datetime.datetime.now()
+    invalid = {job.id for job in jobs if now >= reminder_deadline(job.payload)}
+    booking_ids = {job.payload["booking_id"] for job in jobs if job.id not in invalid}
+    confirmed = set()
+    if booking_ids:
+        confirmed = set((await session.execute(
+            select(Booking.id).where(Booking.id.in_(booking_ids), Booking.status == "confirmed")
+        )).scalars())
+    invalid.update(job.id for job in jobs if job.payload["booking_id"] not in confirmed)
+    return invalid
+
+
+async def send_booking_reminder(bot: Bot, payload: Dict[str, Any]):
+    starts_at = datetime.datetime.fromisoformat(payload["starts_at"])
+    when = "завтра" if payload["label"] == "24h" else "через час"
+    await bot.send_message(
+        payload["chat_id"],
+        f"Напоминаем: ваша консультация {when}, {starts_at.strftime('%d.%m.%Y')} в {starts_at.strftime('%H:%M')}."
+    )
+
+
+class JobQueue:
+    """
+    Database-backed delayed job queue. Due jobs are claimed in batches with
+    SELECT ... FOR UPDATE SKIP LOCKED, so several workers can poll at once without taking the
+    same job, and run concurrently. A job is marked running before it runs: if the process
+    dies mid-run the job is failed once its lease expires instead of being run twice.
+    Claimed jobs that their kind's validator rejects are marked done without running.
+    """
+    def __init__(
+            self,
+            session_maker: async_sessionmaker,
+            bot: Bot,
+            batch_size: int = 200,
+            concurrency: int = 20,
+            lease: datetime.timedelta = datetime.timedelta(minutes=10),
+            max_attempts: int = 5):
+        self.session_maker = session_maker
+        self.bot = bot
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.handlers: Dict[str, JobHandler] = {"booking_reminder": send_booking_reminder}
+        self.validators: Dict[str, JobValidator] = {"booking_reminder": invalid_booking_reminders}
+
+    async def run_due(self) -> Dict[str, int]:
+        """ Runs all jobs that are due, batch by batch. Used as a scheduler job. """
+        totals = {"done": 0, "retried": 0, "skipped": 0, "failed": await self._fail_expired_leases()}
+        while True:
+            jobs, skipped = await self._claim()
+            totals["skipped"] += skipped
+            if jobs:
+                for outcome, count in (await self._run_batch(jobs)).items():
+                    totals[outcome] += count
+            if len(jobs) + skipped < self.batch_size:
+                return totals
+
+    async def _fail_expired_leases(self) -> int:
+        async with self.session_maker() as session:
+            result = await session.execute(
+                update(ScheduledJob)
+                .where(ScheduledJob.status == "running", ScheduledJob.locked_until < datetime.datetime.now())
+                .values(status="failed", last_error="Lease expired, the job may have run")
+            )
+            await session.commit()
+        if result.rowcount:
+            logging.warning(f"{result.rowcount} scheduled jobs were interrupted and marked failed.")
+        return result.rowcount
+
+    async def _claim(self) -> Tuple[Sequence[ScheduledJob], int]:
+        """ Claims a batch of due jobs. Returns the jobs to run and how many were skipped as invalid. """
+        now = datetime.datetime.now()
+        skipped: Set[int] = set()
+        async with self.session_maker() as session:
+            jobs = (await session.execute(
+                select(ScheduledJob)
+                .where(ScheduledJob.status == "pending", ScheduledJob.run_at <= now)
+                .order_by(ScheduledJob.run_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            for kind, validator in self.validators.items():
+                of_kind = [job for job in jobs if job.kind == kind]
+                if of_kind:
+                    skipped |= await validator(session, of_kind)
+            if skipped:
+                await session.execute(
+                    update(ScheduledJob)
+                    .where(ScheduledJob.id.in_(skipped))
+                    .values(status="done", last_error="Skipped: no longer valid")
+                )
+                jobs = [job for job in jobs if job.id not in skipped]
+            if jobs:
+                await session.execute(
+                    update(ScheduledJob)
+                    .where(ScheduledJob.id.in_([job.id for job in jobs]))
+                    .values(status="running", locked_until=now + self.lease, attempts=ScheduledJob.attempts + 1)
+                )
+            await session.commit()
+        return jobs, len(skipped)
+
+    async def _run_batch(self, jobs: Sequence[ScheduledJob]) -> Dict[str, int]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(job: ScheduledJob) -> Optional[Exception]:
+            async with semaphore:
+                try:
+                    await self.handlers[job.kind](self.bot, job.payload)
+                except Exception as e:
+                    return e
+            return None
+
+        errors = await asyncio.gather(*(run(job) for job in jobs))
+        done = [job.id for job, error in zip(jobs, errors) if error is None]
+        outcomes = {"done": len(done), "retried": 0, "failed": 0}
+        async with self.session_maker() as session:
+            if done:
+                await session.execute(update(ScheduledJob).where(ScheduledJob.id.in_(done)).values(status="done"))
+            for job, error in zip(jobs, errors):
+                if error is None:
+                    continue
+                if isinstance(error, _RETRYABLE_ERRORS) and job.attempts < self.max_attempts:
+                    outcomes["retried"] += 1
+                    values = {"status": "pending", "run_at": datetime.datetime.now() + datetime.timedelta(minutes=2 ** job.attempts)}
+                else:
+                    outcomes["failed"] += 1
+                    values = {"status": "failed"}
+                    logging.error(f"Scheduled job {job.dedupe_key} failed: {error!r}")
+                await session.execute(
+                    update(ScheduledJob).where(ScheduledJob.id == job.id).values(last_error=repr(error)[:500], **values)
+                )
+            await session.commit()
+        return outcomes
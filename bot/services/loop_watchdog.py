@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import List, Optional, Sequence
+
+from .metrics import registry
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class LagSummary:
+    """Event loop lag over a sliding window of recent heartbeats, rendered as a Prometheus summary."""
+    def __init__(self, name: str, documentation: str, window: int = 1000, quantiles: Sequence[float] = QUANTILES):
+        self.name = name
+        self.documentation = documentation
+        self.quantiles = tuple(quantiles)
+        self._recent: deque = deque(maxlen=window)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float):
+        self._recent.append(value)
+        self._sum += value
+        self._count += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} summary"]
+        ordered = sorted(self._recent)
+        for quantile in self.quantiles:
+            value = ordered[min(len(ordered) - 1, int(quantile * len(ordered)))] if ordered else 0.0
+            lines.append(f'{self.name}{{quantile="{quantile}"}} {value}')
+        lines.append(f"{self.name}_sum {self._sum}")
+        lines.append(f"{self.name}_count {self._count}")
+        return lines
+
+
+EVENT_LOOP_LAG = registry.register(LagSummary(
+    "bot_event_loop_lag_seconds", "Delay of event loop heartbeats over their schedule."))
+
+
+class LoopWatchdog:
+    """
+    Measures event loop lag with a heartbeat task. A monitor thread notices when the heartbeat
+    stops for longer than the threshold and logs the stack the loop thread is stuck in, which
+    points at the blocking call (sync SDKs, heavy rendering, ...).
+    """
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, slow_callback_debug: bool = False):
+        self.interval = interval
+        self.threshold = threshold
+        self.slow_callback_debug = slow_callback_debug
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self.slow_callback_debug:
+            # asyncio itself logs every callback running longer than the threshold (debug mode has overhead)
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True).start()
+        logging.info(f"Event loop watchdog started (threshold {self.threshold * 1000:.0f} ms).")
+
+    def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled_at = loop.time()
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(0.0, loop.time() - scheduled_at - self.interval))
+            self._last_beat = time.monotonic()
+
+    def _monitor(self):
+        reported_beat = None
+        while not self._stopped.wait(self.interval):
+            last_beat = self._last_beat
+            stalled_for = time.monotonic() - last_beat
+            # Only one sample per stall, taken once it crosses the threshold
+            if stalled_for < self.threshold + self.interval or last_beat == reported_beat:
+                continue
+            reported_beat = last_beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            logging.warning(f"Event loop blocked for {stalled_for * 1000:.0f} ms, loop thread stack:\n{stack}")
@@ -0,0 +1,70 @@
+import datetime
+from typing import Dict
+from aiogram.fsm.storage.base import BaseStorage
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ..database.models import Payment, QuestionnaireSession, ScheduledJob, TimeSlot
+from .fsm_storage import ExpiringMemoryStorage
+
+# Payments that will never be paid; a late YooKassa notification still marks them succeeded
+FINAL_UNPAID_STATUSES = ("expired", "canceled")
+
+
+async def expire_pending_payments(session_maker: async_sessionmaker, max_age: datetime.timedelta) -> Dict[str, int]:
+    """ Marks payments pending for longer than `max_age` as expired. """
+    deadline = datetime.datetime.utcnow() - max_age
+    async with session_maker() as session:
+        result = await session.execute(
+            update(Payment)
+            .where(Payment.status == "pending", Payment.created_at < deadline)
+            .values(status="expired")
+        )
+        await session.commit()
+    return {"expired_payments": result.rowcount}
+
+
+def purge_idle_fsm(storage: BaseStorage, ttl: datetime.timedelta) -> Dict[str, int]:
+    """
+    Drops FSM records of users idle for longer than `ttl`. Only the in-memory storage needs
+    this; Redis expires keys by itself (see create_fsm_storage).
+    """
+    while not isinstance(storage, ExpiringMemoryStorage) and hasattr(storage, "storage"):
+        storage = storage.storage  # unwrap e.g. InstrumentedStorage
+    if not isinstance(storage, ExpiringMemoryStorage):
+        return {"purged_fsm_records": 0}
+    purged = storage.purge_idle(ttl.total_seconds())
+    return {"purged_fsm_records": purged, "fsm_records": len(storage.storage)}
+
+
+async def purge_old_data(session_maker: async_sessionmaker, retention: datetime.timedelta) -> Dict[str, int]:
+    """
+    Deletes unpaid payments, finished scheduled jobs and abandoned questionnaire sessions
+    older than `retention`, and past slots that were never booked.
+    """
+    async with session_maker() as session:
+        payments = await session.execute(
+            delete(Payment).where(
+                Payment.status.in_(FINAL_UNPAID_STATUSES),
+                Payment.created_at < datetime.datetime.utcnow() - retention,
+            )
+        )
+        slots = await session.execute(
+            delete(TimeSlot).where(TimeSlot.is_available == True, TimeSlot.date < datetime.date.today())
+        )
+        jobs = await session.execute(
+            delete(ScheduledJob).where(
+                ScheduledJob.status.in_(("done", "failed")),
+                ScheduledJob.run_at < datetime.datetime.now() - retention,
+            )
+        )
+        sessions = await session.execute(
+            delete(QuestionnaireSession).where(QuestionnaireSession.updated_at < datetime.datetime.utcnow() - retention)
+        )
+        await session.commit()
+    return {
+        "deleted_payments": payments.rowcount,
+        "deleted_slots": slots.rowcount,
+        "deleted_jobs": jobs.rowcount,
+        "deleted_questionnaire_sessions": sessions.rowcount,
+    }
@@ -0,0 +1,228 @@
+import time
+import weakref
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Name of the handler processing the current update, used to label DB metrics
+current_handler: ContextVar[str] = ContextVar("current_handler", default="unhandled")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """A monotonically increasing counter, optionally split by labels."""
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[Any, ...], float] = {}
+
+    def inc(self, *labels: Any, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """A cumulative histogram with fixed buckets, optionally split by labels."""
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[Any, ...], list] = {}
+
+    def observe(self, value: float, *labels: Any):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {total}")
+            lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+class StatsCollector:
+    """Exposes a plain dict of counters (e.g. middleware stats) as one labelled counter."""
+    def __init__(self, name: str, documentation: str, label: str, stats: Dict[str, int]):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.stats = stats
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in self.stats.items():
+            lines.append(f'{self.name}{{{self.label}="{key}"}} {value}')
+        return lines
+
+
+class MetricsRegistry:
+    """Holds all metrics and renders them in the Prometheus text exposition format."""
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+UPDATES_TOTAL = registry.register(Counter(
+    "bot_updates_total", "Processed updates per handler.", ["handler"]))
+UPDATE_DURATION = registry.register(Histogram(
+    "bot_update_duration_seconds", "Full update processing time per handler.", ["handler"]))
+ROUTER_FILTER_DURATION = registry.register(Histogram(
+    "bot_router_filter_duration_seconds", "Time spent in router filters and event middlewares before the handler ran."))
+DB_QUERIES_TOTAL = registry.register(Counter(
+    "bot_db_queries_total", "SQL statements executed per handler.", ["handler"]))
+DB_QUERY_DURATION = registry.register(Histogram(
+    "bot_db_query_duration_seconds", "SQL statement execution time per handler.", ["handler"]))
+FSM_STORAGE_DURATION = registry.register(Histogram(
+    "bot_fsm_storage_duration_seconds", "FSM storage call latency per operation.", ["operation"]))
+TELEGRAM_API_DURATION = registry.register(Histogram(
+    "bot_telegram_api_duration_seconds", "Telegram Bot API call latency per method.", ["method"]))
+TELEGRAM_API_ERRORS = registry.register(Counter(
+    "bot_telegram_api_errors_total", "Failed Telegram Bot API calls per method and error code.", ["method", "code"]))
+PAYMENT_CREATE_DURATION = registry.register(Histogram(
+    "bot_payment_create_duration_seconds", "YooKassa payment creation latency.", ["status"]))
+
+
+# callback(statement, duration, error, started): error is the exception of a failed statement,
+# started whatever the start hook returned before the statement ran
+StatementCallback = Callable[[str, float, Optional[BaseException], Any], None]
+StatementStart = Callable[[str], Any]
+
+_statement_hooks: "weakref.WeakKeyDictionary[Engine, List[Tuple[Optional[StatementStart], StatementCallback]]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def on_statement(engine: AsyncEngine, callback: StatementCallback, start: Optional[StatementStart] = None):
+    """
+    Calls `start(statement)`, if given, before and `callback` after every SQL statement executed
+    by the engine, failed ones included. The cursor events are listened to once per engine and
+    shared by all hooks (metrics, SQL profiler, tracing).
+    """
+    sync_engine = engine.sync_engine
+    hooks = _statement_hooks.get(sync_engine)
+    if hooks is None:
+        hooks = _statement_hooks[sync_engine] = []
+        _listen_statements(sync_engine, hooks)
+    hooks.append((start, callback))
+
+
+def _listen_statements(sync_engine: Engine, hooks: List[Tuple[Optional[StatementStart], StatementCallback]]):
+    def _finish(conn, statement: str, error: Optional[BaseException]):
+        started_at, started = conn.info["statement_start"].pop()
+        duration = time.perf_counter() - started_at
+        for (_, callback), value in zip(hooks, started):
+            callback(statement, duration, error, value)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = [start(statement) if start else None for start, _ in hooks]
+        conn.info.setdefault("statement_start", []).append((time.perf_counter(), started))
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _finish(conn, statement, None)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(exception_context):
+        # after_cursor_execute does not run for a failed statement
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("statement_start"):
+            _finish(conn, exception_context.statement or "", exception_context.original_exception)
+
+
+def instrument_engine(engine: AsyncEngine):
+    """ Records count and duration of every SQL statement, labelled with the current handler. """
+    def record(statement: str, duration: float, error: Optional[BaseException], started: Any):
+        handler = current_handler.get()
+        DB_QUERIES_TOTAL.inc(handler)
+        DB_QUERY_DURATION.observe(duration, handler)
+
+    on_statement(engine, record)
+
+
+class InstrumentedStorage(BaseStorage):
+    """ Wraps an FSM storage and records the latency of each call. """
+    def __init__(self, storage: BaseStorage):
+        self.storage = storage
+
+    async def _timed(self, operation: str, call: Callable, *args):
+        started_at = time.perf_counter()
+        try:
+            return await call(*args)
+        finally:
+            FSM_STORAGE_DURATION.observe(time.perf_counter() - started_at, operation)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._timed("set_state", self.storage.set_state, key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._timed("get_state", self.storage.get_state, key)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._timed("set_data", self.storage.set_data, key, data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return await self._timed("get_data", self.storage.get_data, key)
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._timed("update_data", self.storage.update_data, key, data)
+
+    async def close(self) -> None:
+        await self.storage.close()
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(body=registry.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4"})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """ Serves /metrics from a separate server, for polling mode where there is no webhook app. """
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
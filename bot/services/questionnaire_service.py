@@ -9,6 +9,8 @@ from sqlalchemy.orm import selectinload
 
 from ..database.models import Questionnaire, Question, QuestionLogic
 from ..states.questionnaire import QuestionnaireFSM
+from .render_cache import render_cache
+from .dosha_scoring import dosha_scorer
 
 
 class CachedQuestion:
@@ -42,6 +44,8 @@ class QuestionnaireService:
     """
     def __init__(self):
         self._caches: Dict[str, QuestionnaireCache] = {}
+        self._questions: Dict[int, CachedQuestion] = {}
+        self._question_titles: Dict[int, str] = {}
 
     async def load_from_db(self, session: AsyncSession):
         logging.info("Loading all questionnaires into memory cache...")
@@ -74,11 +78,23 @@ class QuestionnaireService:
                         cache.logic[q.id][logic_rule.answer_value] = logic_rule.next_question_id
             
             self._caches[q_naire.title] = cache
+            self._questions.update(cache.questions)
+            self._question_titles.update(dict.fromkeys(cache.questions, q_naire.title))
             logging.info(f"Loaded questionnaire '{q_naire.title}' with {len(cache.questions)} questions.")
 
+        dosha_scorer.compile(self._caches)
+
     def get_questionnaire_by_title(self, title: str) -> Optional[QuestionnaireCache]:
         return self._caches.get(title)
 
+    def get_question(self, question_id: int) -> Optional[CachedQuestion]:
+        """ Looks up a question in any of the loaded questionnaires. """
+        return self._questions.get(question_id)
+
+    def get_questionnaire_title(self, question_id: int) -> Optional[str]:
+        """ Title of the questionnaire a question belongs to. """
+        return self._question_titles.get(question_id)
+
     async def start_questionnaire(self, bot: Bot, user_id: int, message_id: int, state: FSMContext, session: AsyncSession):
         from ..handlers import questionnaire as q_handler
 
@@ -94,15 +110,14 @@ class QuestionnaireService:
         q_cache = self.get_questionnaire_by_title(next_q_title)
 
         if not q_cache or not q_cache.start_question_id:
-            await bot.edit_message_text(chat_id=user_id, message_id=message_id, text=f"Не удалось запустить опросник '{next_q_title}'.")
+            await render_cache.render(bot, user_id, message_id, text=f"Не удалось запустить опросник '{next_q_title}'.")
             await q_handler.end_current_questionnaire_and_proceed(bot, user_id, message_id, state, session)
             return
         
         await state.set_state(QuestionnaireFSM.IN_QUESTIONNAIRE)
         await state.update_data(
             pending_questionnaires=pending,
-            current_questionnaire_title=next_q_title,
-            question_history=[]
+            current_questionnaire_title=next_q_title
         )
         
         await q_handler.show_question(bot, user_id, message_id, state, session, q_cache.start_question_id)
@@ -0,0 +1,103 @@
+import datetime
+import json
+from typing import Any, Dict, List, Mapping, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database.models import QuestionnaireResult, QuestionnaireSession, User
+from ..database.session import dialect_insert
+from .answer_summary import add_to_summary
+from .dosha_scoring import dosha_scorer
+from .questionnaire_service import QuestionnaireService
+
+# FSM data kept in the data column besides the position in the flow, when the answers
+# are not kept in questionnaire_results (QUESTIONNAIRE_RESULTS_ENABLED=False)
+SESSION_DATA_KEYS = ("answers", "answer_summary", "dosha_scores")
+
+
+async def save_session(session: AsyncSession, telegram_id: int, fsm_data: Mapping[str, Any], current_question_id: int):
+    """
+    Upserts the user's position in the questionnaires. The answers are already written to
+    questionnaire_results one by one, so they are rebuilt from there on load instead of
+    being rewritten on every question. Does not commit.
+    """
+    data = {} if settings.QUESTIONNAIRE_RESULTS_ENABLED else {key: fsm_data[key] for key in SESSION_DATA_KEYS if key in fsm_data}
+    statement = dialect_insert(session, QuestionnaireSession).values(
+        user_id=select(User.id).where(User.telegram_id == telegram_id).scalar_subquery(),
+        current_questionnaire_title=fsm_data["current_questionnaire_title"],
+        current_question_id=current_question_id,
+        pending_questionnaires=fsm_data.get("pending_questionnaires", []),
+        question_history=fsm_data.get("question_history", []),
+        data=data,
+        updated_at=datetime.datetime.utcnow(),
+    )
+    await session.execute(statement.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            column: statement.excluded[column]
+            for column in ("current_questionnaire_title", "current_question_id", "pending_questionnaires",
+                           "question_history", "data", "updated_at")
+        },
+    ))
+
+
+async def _rebuild_answers(
+        session: AsyncSession,
+        user_id: int,
+        history: List[int],
+        questionnaire_service: QuestionnaireService) -> Dict[str, Any]:
+    """
+    FSM answers, summary and dosha scores of the questions in the history, from the
+    questionnaire_results documents. Answers taken back with the Back button are no longer
+    in the history, so they are left out even though the documents still hold them.
+    """
+    titles = {questionnaire_service.get_questionnaire_title(question_id) for question_id in history}
+    documents = {}
+    for (answers,) in await session.execute(
+        select(QuestionnaireResult.answers)
+        .where(QuestionnaireResult.user_id == user_id, QuestionnaireResult.questionnaire_title.in_(titles))
+    ):
+        documents.update(answers)
+
+    answers, summary, scores = {}, {}, {}
+    for question_id in history:
+        question = questionnaire_service.get_question(question_id)
+        answer_value = documents.get(str(question_id))
+        if question is None or answer_value is None:
+            continue
+        # Documents store multi-choice answers as lists, FSM data as JSON strings
+        answers[str(question_id)] = json.dumps(answer_value, ensure_ascii=False) if question.type == "multi" else answer_value
+        add_to_summary(summary, question, answer_value)
+        if dosha_scorer.is_scored(question_id):
+            scores = dosha_scorer.apply(scores, question_id, answer_value)
+    return {"answers": answers, "answer_summary": summary, "dosha_scores": scores}
+
+
+async def load_session(
+        session: AsyncSession,
+        telegram_id: int,
+        questionnaire_service: QuestionnaireService) -> Optional[Dict[str, Any]]:
+    """ Returns the saved progress as FSM data, or None when the user has nothing to resume. """
+    row = (await session.execute(
+        select(QuestionnaireSession)
+        .join(User, QuestionnaireSession.user_id == User.id)
+        .where(User.telegram_id == telegram_id)
+    )).scalar_one_or_none()
+    if row is None:
+        return None
+    data = dict(row.data)
+    if settings.QUESTIONNAIRE_RESULTS_ENABLED:
+        data.update(await _rebuild_answers(session, row.user_id, row.question_history, questionnaire_service))
+    return {
+        **data,
+        "current_questionnaire_title": row.current_questionnaire_title,
+        "current_question_id": row.current_question_id,
+        "pending_questionnaires": row.pending_questionnaires,
+        "question_history": row.question_history,
+    }
+
+
+async def delete_session(session: AsyncSession, user_id: int):
+    """ Forgets the progress once all questionnaires are done or a new flow starts. Does not commit. """
+    await session.execute(delete(QuestionnaireSession).where(QuestionnaireSession.user_id == user_id))
@@ -0,0 +1,82 @@
+import logging
+from collections import OrderedDict
+from typing import Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup
+
+
+def _markup_hash(reply_markup: Optional[InlineKeyboardMarkup]) -> Optional[int]:
+    if reply_markup is None:
+        return None
+    return hash(reply_markup.model_dump_json(exclude_none=True))
+
+
+class MessageRenderCache:
+    """
+    Remembers the text and keyboard last rendered into each message, keyed by (chat_id, message_id),
+    so edits send only what changed: the keyboard, the whole message or nothing at all.
+    """
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[int, Optional[int]]]" = OrderedDict()
+
+    def remember(self, chat_id: int, message_id: int, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None):
+        """ Stores what a message currently shows, e.g. right after it was sent. """
+        self._store((chat_id, message_id), hash(text), _markup_hash(reply_markup))
+
+    def forget(self, chat_id: int, message_id: int):
+        self._entries.pop((chat_id, message_id), None)
+
+    def _store(self, key: Tuple[int, int], text_hash: int, markup_hash: Optional[int]):
+        self._entries[key] = (text_hash, markup_hash)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def render(
+        self, bot: Bot, chat_id: int, message_id: int, text: str,
+        reply_markup: Optional[InlineKeyboardMarkup] = None
+    ) -> bool:
+        """
+        Brings the message to the given text and keyboard. Returns False if no API call was needed.
+        """
+        key = (chat_id, message_id)
+        text_hash, markup_hash = hash(text), _markup_hash(reply_markup)
+        cached = self._entries.get(key)
+
+        if cached == (text_hash, markup_hash):
+            return False
+        try:
+            if cached and cached[0] == text_hash:
+                await bot.edit_message_reply_markup(chat_id=chat_id, message_id=message_id, reply_markup=reply_markup)
+            else:
+                await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+            logging.debug(f"Message {message_id} in chat {chat_id} was already up to date.")
+
+        self._store(key, text_hash, markup_hash)
+        return True
+
+    async def render_markup(self, bot: Bot, chat_id: int, message_id: int, reply_markup: Optional[InlineKeyboardMarkup]) -> bool:
+        """ Updates only the keyboard of a message, skipping the call if it is unchanged. """
+        key = (chat_id, message_id)
+        markup_hash = _markup_hash(reply_markup)
+        cached = self._entries.get(key)
+
+        if cached and cached[1] == markup_hash:
+            return False
+        try:
+            await bot.edit_message_reply_markup(chat_id=chat_id, message_id=message_id, reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+
+        if cached:
+            self._store(key, cached[0], markup_hash)
+        return True
+
+
+render_cache = MessageRenderCache()
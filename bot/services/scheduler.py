@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple
+
+from .metrics import registry, Histogram
+
+JOB_DURATION = registry.register(Histogram(
+    "bot_job_duration_seconds", "Background job run time per job and outcome.", ["job", "status"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)))
+
+
+class Job(NamedTuple):
+    name: str
+    interval: float
+    func: Callable[[], Awaitable[Any]]
+    run_at_start: bool
+
+
+class Scheduler:
+    """
+    Runs periodic background jobs, one asyncio task per job. A job runs again `interval`
+    seconds after its previous run finished, so runs of the same job never overlap.
+    Every run is logged and recorded with its duration.
+    """
+    def __init__(self):
+        self._jobs: List[Job] = []
+        self._tasks: List[asyncio.Task] = []
+        # job name -> {"runs", "failures", "last_duration"}
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    def add_job(self, name: str, interval: float, func: Callable[[], Awaitable[Any]], run_at_start: bool = False):
+        self._jobs.append(Job(name, interval, func, run_at_start))
+        self.stats[name] = {"runs": 0, "failures": 0, "last_duration": 0.0}
+
+    def start(self):
+        for job in self._jobs:
+            self._tasks.append(asyncio.create_task(self._loop(job), name=f"job:{job.name}"))
+        logging.info(f"Scheduler started with jobs: {', '.join(job.name for job in self._jobs)}.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def run_job(self, job: Job):
+        """ Runs a job once, recording its duration. Errors are logged, not raised. """
+        stats = self.stats[job.name]
+        started_at = time.perf_counter()
+        status = "ok"
+        try:
+            result = await job.func()
+        except Exception as e:
+            status = "error"
+            stats["failures"] += 1
+            logging.exception(f"Job {job.name} failed: {e}")
+            result = None
+        duration = time.perf_counter() - started_at
+        stats["runs"] += 1
+        stats["last_duration"] = duration
+        JOB_DURATION.observe(duration, job.name, status)
+        if status == "ok":
+            logging.info(f"Job {job.name} finished in {duration * 1000:.0f} ms: {result}")
+
+    async def _loop(self, job: Job):
+        if not job.run_at_start:
+            await asyncio.sleep(job.interval)
+        while True:
+            await self.run_job(job)
+            await asyncio.sleep(job.interval)
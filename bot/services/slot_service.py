@@ -0,0 +1,159 @@
+import datetime
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database.models import TimeSlot
+from ..database.session import dialect_insert
+
+# Keeps the bulk INSERT well below the bind parameter limit of asyncpg (32767)
+MAX_BULK_SLOTS = 5000
+
+WEEKDAYS = {"пн": 0, "вт": 1, "ср": 2, "чт": 3, "пт": 4, "сб": 5, "вс": 6}
+
+# "2025-07-01 2025-07-31; пн ср пт; 10:00-18:00; 60"
+_SCHEDULE_RE = re.compile(
+    r"^\s*(?P<start>\d{4}-\d{2}-\d{2})(?:\s*(?:-|\s)\s*(?P<end>\d{4}-\d{2}-\d{2}))?\s*;"
+    r"\s*(?P<weekdays>[^;]*);"
+    r"\s*(?P<from>\d{1,2}:\d{2})\s*-\s*(?P<to>\d{1,2}:\d{2})\s*"
+    r"(?:;\s*(?P<step>\d+)\s*)?$"
+)
+
+SCHEDULE_FORMAT_HELP = (
+    "Формат: <code>начало конец; дни недели; с-по; шаг в минутах</code>\n"
+    "Например: <code>2025-07-01 2025-07-31; пн ср пт; 10:00-18:00; 60</code>\n"
+    "Дни недели можно не указывать (<code>все</code>), шаг по умолчанию — 60 минут. "
+    "Время «по» входит в расписание."
+)
+
+
+class SlotSchedule(NamedTuple):
+    """A schedule template: every `step` from `start_time` to `end_time` on the given weekdays of a date range."""
+    start_date: datetime.date
+    end_date: datetime.date
+    weekdays: Set[int]
+    start_time: datetime.time
+    end_time: datetime.time
+    step: datetime.timedelta
+
+
+def parse_schedule(text: str) -> SlotSchedule:
+    """ Parses an admin schedule line, raising ValueError with a user-facing message on bad input. """
+    match = _SCHEDULE_RE.match(text)
+    if not match:
+        raise ValueError("Не удалось разобрать расписание.")
+
+    start_date = datetime.date.fromisoformat(match["start"])
+    end_date = datetime.date.fromisoformat(match["end"]) if match["end"] else start_date
+    if end_date < start_date:
+        raise ValueError("Дата окончания раньше даты начала.")
+    if (end_date - start_date).days > 366:
+        raise ValueError("Диапазон дат не может превышать год.")
+
+    weekday_names = match["weekdays"].replace(",", " ").lower().split()
+    if not weekday_names or weekday_names == ["все"]:
+        weekdays = set(WEEKDAYS.values())
+    else:
+        unknown = [name for name in weekday_names if name not in WEEKDAYS]
+        if unknown:
+            raise ValueError(f"Неизвестные дни недели: {', '.join(unknown)}.")
+        weekdays = {WEEKDAYS[name] for name in weekday_names}
+
+    start_time = datetime.time.fromisoformat(match["from"].zfill(5))
+    end_time = datetime.time.fromisoformat(match["to"].zfill(5))
+    if end_time < start_time:
+        raise ValueError("Время окончания раньше времени начала.")
+    step = datetime.timedelta(minutes=int(match["step"] or 60))
+    if step < datetime.timedelta(minutes=5):
+        raise ValueError("Шаг не может быть меньше 5 минут.")
+
+    return SlotSchedule(start_date, end_date, weekdays, start_time, end_time, step)
+
+
+def generate_slots(schedule: SlotSchedule) -> List[Tuple[datetime.date, datetime.time]]:
+    """ Expands a schedule into (date, time) pairs. """
+    times = []
+    moment = datetime.datetime.combine(schedule.start_date, schedule.start_time)
+    last = datetime.datetime.combine(schedule.start_date, schedule.end_time)
+    while moment <= last:
+        times.append(moment.time())
+        moment += schedule.step
+
+    slots = []
+    day = schedule.start_date
+    while day <= schedule.end_date:
+        if day.weekday() in schedule.weekdays:
+            slots.extend((day, slot_time) for slot_time in times)
+        day += datetime.timedelta(days=1)
+    return slots
+
+
+async def bulk_create_slots(session: AsyncSession, slots: Sequence[Tuple[datetime.date, datetime.time]]) -> int:
+    """
+    Inserts the slots in one statement, skipping the ones that already exist
+    (unique date and time). Returns the number of created slots. Does not commit.
+    """
+    if not slots:
+        return 0
+    statement = dialect_insert(session, TimeSlot).values([
+        {"date": slot_date, "time": slot_time, "is_available": True} for slot_date, slot_time in slots
+    ]).on_conflict_do_nothing(index_elements=["date", "time"])
+    result = await session.execute(statement)
+    return result.rowcount
+
+
+class DayOccupancy(NamedTuple):
+    free: int
+    booked: int
+
+
+class OccupancyCache:
+    """
+    Per-month slot occupancy, cached for `ttl` seconds and dropped when slots or bookings
+    of the month change. Other workers see a write at the latest after `ttl`.
+    """
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._months: Dict[datetime.date, Tuple[float, Dict[datetime.date, DayOccupancy]]] = {}
+
+    def get(self, month: datetime.date) -> Optional[Dict[datetime.date, DayOccupancy]]:
+        entry = self._months.get(month)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, month: datetime.date, occupancy: Dict[datetime.date, DayOccupancy]):
+        self._months[month] = (time.monotonic(), occupancy)
+
+    def invalidate(self, *days: datetime.date):
+        """ Drops the months containing the given days. Call after the write is committed. """
+        for day in days:
+            self._months.pop(day.replace(day=1), None)
+
+
+occupancy_cache = OccupancyCache(ttl=settings.SLOT_OCCUPANCY_CACHE_TTL)
+
+
+async def get_month_occupancy(session: AsyncSession, day: datetime.date) -> Dict[datetime.date, DayOccupancy]:
+    """ Free and booked slot counts per date of the month containing `day`, in one grouped query. """
+    month = day.replace(day=1)
+    occupancy = occupancy_cache.get(month)
+    if occupancy is not None:
+        return occupancy
+
+    next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+    rows = await session.execute(
+        select(
+            TimeSlot.date,
+            func.sum(case((TimeSlot.is_available == True, 1), else_=0)),
+            func.sum(case((TimeSlot.is_available == True, 0), else_=1)),
+        )
+        .where(TimeSlot.date >= month, TimeSlot.date < next_month)
+        .group_by(TimeSlot.date)
+    )
+    occupancy = {slot_date: DayOccupancy(int(free), int(booked)) for slot_date, free, booked in rows}
+    occupancy_cache.put(month, occupancy)
+    return occupancy
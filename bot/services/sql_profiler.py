@@ -0,0 +1,104 @@
+import logging
+import re
+from collections import Counter as ShapeCounter
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .metrics import registry, Counter, on_statement
+
+_PLACEHOLDER_RE = re.compile(r"\$\d+|%\(\w+\)s|\?")
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\?(?:, \?)+\)")
+
+SQL_PROFILE_DUPLICATES = registry.register(Counter(
+    "bot_sql_duplicate_statements_total", "Statements repeated within one update, per handler.", ["handler"]))
+SQL_PROFILE_SLOW_UPDATES = registry.register(Counter(
+    "bot_sql_slow_updates_total", "Updates over the SQL statement count or time budget, per handler.", ["handler"]))
+
+
+def statement_shape(statement: str) -> str:
+    """ Normalizes a statement so that executions differing only in parameters compare equal. """
+    shape = _PLACEHOLDER_RE.sub("?", " ".join(statement.split()))
+    return _PLACEHOLDER_LIST_RE.sub("(?...)", shape)
+
+
+class UpdateProfile:
+    """SQL statements executed while handling one update."""
+    __slots__ = ("count", "total_time", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes: ShapeCounter = ShapeCounter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.total_time += duration
+        self.shapes[statement_shape(statement)] += 1
+
+    def duplicates(self) -> List[Tuple[str, int]]:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > 1]
+
+
+_current_profile: ContextVar[Optional[UpdateProfile]] = ContextVar("sql_profile", default=None)
+
+
+def instrument_engine(engine: AsyncEngine):
+    """ Feeds every executed statement into the profile of the update being handled, if any. """
+    def record(statement: str, duration: float, error: Optional[BaseException], started: Any):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.record(statement, duration)
+
+    on_statement(engine, record)
+
+
+class SqlProfilerMiddleware(BaseMiddleware):
+    """
+    Inner event middleware: collects the statements issued by each handler call, keeps
+    per-handler totals and logs updates that repeat statements or exceed the budget.
+    """
+    def __init__(self, slow_ms: float, max_statements: int):
+        super().__init__()
+        self.slow_ms = slow_ms
+        self.max_statements = max_statements
+        # handler -> {"updates", "statements", "time_ms", "max_statements"}
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        profile = UpdateProfile()
+        token = _current_profile.set(profile)
+        try:
+            return await handler(event, data)
+        finally:
+            _current_profile.reset(token)
+            handler_object = data.get("handler")
+            handler_name = getattr(handler_object.callback, "__name__", "unknown") if handler_object else "unknown"
+            self._report(handler_name, profile)
+
+    def _report(self, handler_name: str, profile: UpdateProfile):
+        stats = self.stats.setdefault(handler_name, {"updates": 0, "statements": 0, "time_ms": 0.0, "max_statements": 0})
+        time_ms = profile.total_time * 1000
+        stats["updates"] += 1
+        stats["statements"] += profile.count
+        stats["time_ms"] += time_ms
+        stats["max_statements"] = max(stats["max_statements"], profile.count)
+
+        duplicates = profile.duplicates()
+        for shape, count in duplicates:
+            SQL_PROFILE_DUPLICATES.inc(handler_name, amount=count - 1)
+            logging.warning(f"SQL profiler: {handler_name} ran the same statement {count} times: {shape[:300]}")
+
+        if profile.count > self.max_statements or time_ms > self.slow_ms:
+            SQL_PROFILE_SLOW_UPDATES.inc(handler_name)
+            logging.warning(
+                f"SQL profiler: {handler_name} issued {profile.count} statements in {time_ms:.1f} ms "
+                f"(budget: {self.max_statements} statements, {self.slow_ms} ms)."
+            )
@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, IO, Optional
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .metrics import on_statement
+
+# Correlation id of the update being handled, added to every log record
+correlation_id: ContextVar[str] = ContextVar("correlation_id", default="-")
+
+
+class Span:
+    """A unit of traced work. Serialized with OpenTelemetry (OTLP JSON) field names."""
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": [{"key": key, "value": {"stringValue": str(value)}} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Lightweight tracer: a root span per sampled update and child spans for the work done on
+    its behalf. Spans are written as JSON lines to a file or stdout. Unsampled updates only
+    get a correlation id, so the cost of tracing is proportional to the sample rate.
+    """
+    def __init__(self):
+        self.sample_rate = 0.0
+        self._output: Optional[IO[str]] = None
+
+    def configure(self, sample_rate: float, export_path: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self._output = open(export_path, "a", encoding="utf-8", buffering=1) if export_path else sys.stdout
+
+    @contextmanager
+    def update_span(self, name: str, **attributes: Any):
+        """ Opens the root span of an update (if sampled) and sets the correlation id. """
+        trace_id = os.urandom(16).hex()
+        id_token = correlation_id.set(trace_id[:16])
+        if not self._output or random.random() >= self.sample_rate:
+            try:
+                yield None
+            finally:
+                correlation_id.reset(id_token)
+            return
+
+        span = Span(name, trace_id, None, attributes)
+        span_token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            _current_span.reset(span_token)
+            correlation_id.reset(id_token)
+            self._finish(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any):
+        """ Opens a child span of the current one. Does nothing outside a sampled update. """
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+
+        span = Span(name, parent.trace_id, parent.span_id, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    def start_child(self, name: str, **attributes: Any) -> Optional[Span]:
+        """ Starts a child span without making it current, for callback-style hooks. """
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        return Span(name, parent.trace_id, parent.span_id, attributes)
+
+    def set_attribute(self, key: str, value: Any):
+        """ Sets an attribute on the current span, if any. """
+        span = _current_span.get()
+        if span is not None:
+            span.attributes[key] = value
+
+    def _finish(self, span: Span):
+        span.end_ns = time.time_ns()
+        try:
+            self._output.write(json.dumps(span.to_dict(), ensure_ascii=False) + "\n")
+        except Exception as e:
+            logging.debug(f"Failed to export span {span.name}: {e}")
+
+
+tracer = Tracer()
+
+
+class CorrelationIdFilter(logging.Filter):
+    """ Adds the correlation id of the current update to log records. """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+def instrument_engine(engine: AsyncEngine):
+    """ Records a child span for every SQL statement executed during a sampled update. """
+    def start(statement: str) -> Optional[Span]:
+        return tracer.start_child("sql", statement=statement[:500])
+
+    def finish(statement: str, duration: float, error: Optional[BaseException], span: Optional[Span]):
+        if span is not None:
+            if error is not None:
+                span.error = repr(error)
+            tracer._finish(span)
+
+    on_statement(engine, finish, start=start)
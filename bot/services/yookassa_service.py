@@ -1,14 +1,12 @@
 import uuid
+import time
 import logging
 import asyncio
 from typing import Optional, Dict, Any, List
 
-from yookassa import Configuration, Payment as YooKassaPayment
-from yookassa.domain.request.payment_request_builder import PaymentRequestBuilder
-from yookassa.domain.common.confirmation_type import ConfirmationType
-from yookassa.domain.notification import WebhookNotificationFactory
-
 from ..config import settings
+from .metrics import PAYMENT_CREATE_DURATION
+from .tracing import tracer
 
 
 class YooKassaService:
@@ -18,6 +16,9 @@ class YooKassaService:
     """
 
     def __init__(self, bot_username: Optional[str] = None):
+        # The SDK is imported on first use, so processes that never take a payment do not load it
+        from yookassa import Configuration
+
         # Configure SDK with credentials from settings
         Configuration.account_id = settings.YOOKASSA_SHOP_ID.get_secret_value() if settings.YOOKASSA_SHOP_ID else None
         Configuration.secret_key = settings.YOOKASSA_SECRET_KEY.get_secret_value() if settings.YOOKASSA_SECRET_KEY else None
@@ -85,6 +86,10 @@ class YooKassaService:
             logging.error("CRITICAL: No email/phone for YooKassa receipt provided and YOOKASSA_DEFAULT_RECEIPT_EMAIL is not set.")
             return {"error": True, "internal_message": "YooKassa receipt customer contact (email/phone) missing and no default email configured."}
 
+        from yookassa import Payment as YooKassaPayment
+        from yookassa.domain.request.payment_request_builder import PaymentRequestBuilder
+        from yookassa.domain.common.confirmation_type import ConfirmationType
+
         try:
             builder = PaymentRequestBuilder()
             builder.set_amount({
@@ -122,7 +127,14 @@ class YooKassaService:
             logging.info(f"Creating YooKassa payment (Idempotence-Key: {idempotence_key}). Amount: {amount} {currency}. Metadata: {metadata}. Receipt: {receipt_data_dict}")
 
             loop = asyncio.get_running_loop()
-            response = await loop.run_in_executor(None, lambda: YooKassaPayment.create(payment_request, idempotence_key))
+            started_at = time.perf_counter()
+            try:
+                with tracer.span("yookassa.create_payment", amount=amount, currency=currency):
+                    response = await loop.run_in_executor(None, lambda: YooKassaPayment.create(payment_request, idempotence_key))
+            except Exception:
+                PAYMENT_CREATE_DURATION.observe(time.perf_counter() - started_at, "error")
+                raise
+            PAYMENT_CREATE_DURATION.observe(time.perf_counter() - started_at, "ok")
 
             logging.info(f"YooKassa Payment.create response: ID={response.id}, Status={response.status}, Paid={response.paid}")
 
@@ -149,11 +161,13 @@ class YooKassaService:
         if not self.configured:
             logging.error("YooKassa is not configured. Cannot get payment info.")
             return None
+        from yookassa import Payment as YooKassaPayment
         try:
             logging.info(f"Fetching payment info from YooKassa for ID: {payment_id_in_yookassa}")
 
             loop = asyncio.get_running_loop()
-            payment_info_yk = await loop.run_in_executor(None, lambda: YooKassaPayment.find_one(payment_id_in_yookassa))
+            with tracer.span("yookassa.get_payment_info", payment_id=payment_id_in_yookassa):
+                payment_info_yk = await loop.run_in_executor(None, lambda: YooKassaPayment.find_one(payment_id_in_yookassa))
 
             if payment_info_yk:
                 logging.info(f"YooKassa payment info for {payment_id_in_yookassa}: Status={payment_info_yk.status}, Paid={payment_info_yk.paid}")
@@ -193,6 +207,7 @@ class YooKassaService:
         if not self.configured:
             logging.error("YooKassa is not configured. Cannot cancel payment.")
             return False
+        from yookassa import Payment as YooKassaPayment
         try:
             loop = asyncio.get_running_loop()
             await loop.run_in_executor(None, lambda: YooKassaPayment.cancel(payment_id_in_yookassa))
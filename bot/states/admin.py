@@ -9,3 +9,4 @@ class AdminFSM(StatesGroup):
     ADD_SLOT_DATE = State()
     ADD_SLOT_TIME = State()
     ADD_SLOT_CONFIRM = State()
+    BULK_SCHEDULE = State()  # Waiting for a schedule template to generate slots from
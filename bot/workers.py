@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+from .config import settings
+
+# Headers that have to reach the worker unchanged
+_FORWARDED_HEADERS = ("Content-Type", "X-Telegram-Bot-Api-Secret-Token")
+
+
+def extract_chat_id(update: Dict[str, Any]) -> Optional[int]:
+    """
+    Finds the chat (or, for chat-less updates, the user) an incoming Telegram update belongs to.
+    """
+    for payload in update.values():
+        if not isinstance(payload, dict):
+            continue
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return chat["id"]
+        user = payload.get("from") or payload.get("user")
+        if user and "id" in user:
+            return user["id"]
+    return None
+
+
+def extract_payment_chat_id(notification: Dict[str, Any]) -> Optional[int]:
+    """
+    Finds the Telegram user a YooKassa notification belongs to (stored in payment metadata).
+    """
+    metadata = (notification.get("object") or {}).get("metadata") or {}
+    try:
+        return int(metadata["user_id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _add_worker_label(sample: str, index: int) -> str:
+    name, brace, rest = sample.partition("{")
+    if brace:
+        return f'{name}{{worker="{index}",{rest}'
+    name, _, value = sample.partition(" ")
+    return f'{name}{{worker="{index}"}} {value}'
+
+
+def merge_worker_metrics(outputs: Dict[int, str]) -> str:
+    """
+    Merges the /metrics output of the workers: every series gets a worker label, and the series
+    of one metric from all workers are grouped under a single HELP/TYPE header.
+    """
+    families: Dict[str, Tuple[List[str], List[str]]] = {}
+    for index, text in outputs.items():
+        headers, samples = None, None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                name = line.split(" ", 3)[2]
+                if name not in families:
+                    families[name] = ([], [])
+                headers, samples = families[name]
+                if len(headers) < 2 and line not in headers:
+                    headers.append(line)
+            elif line and samples is not None:
+                samples.append(_add_worker_label(line, index))
+
+    lines: List[str] = []
+    for headers, samples in families.values():
+        lines.extend(headers)
+        lines.extend(samples)
+    return "\n".join(lines + [""])
+
+
+class WebhookFront:
+    """
+    Receives all webhook requests on the public port and forwards each one to a worker process.
+    Workers are picked by chat id, so every update of a user is handled by the same worker, in order.
+    """
+
+    def __init__(self, workers: int, base_port: int):
+        self.workers = workers
+        self.base_port = base_port
+        self._session: Optional[ClientSession] = None
+        self._processes: List[asyncio.subprocess.Process] = []
+
+    def worker_index(self, chat_id: Optional[int]) -> int:
+        if chat_id is None:
+            return 0
+        return abs(chat_id) % self.workers
+
+    async def _forward(self, request: web.Request, chat_id: Optional[int]) -> web.Response:
+        body = await request.read()
+        index = self.worker_index(chat_id)
+        url = f"http://127.0.0.1:{self.base_port + index}{request.path}"
+        headers = {name: request.headers[name] for name in _FORWARDED_HEADERS if name in request.headers}
+        try:
+            async with self._session.post(url, data=body, headers=headers) as response:
+                return web.Response(
+                    status=response.status,
+                    body=await response.read(),
+                    headers={"Content-Type": response.headers.get("Content-Type", "text/plain")},
+                )
+        except Exception as e:
+            logging.error(f"Failed to forward {request.path} to worker {index}: {e}")
+            return web.Response(status=503)
+
+    async def _worker_metrics(self, index: int) -> Optional[str]:
+        try:
+            async with self._session.get(f"http://127.0.0.1:{self.base_port + index}/metrics") as response:
+                if response.status == 200:
+                    return await response.text()
+                logging.warning(f"Worker {index} answered /metrics with {response.status}")
+        except Exception as e:
+            logging.warning(f"Failed to collect metrics of worker {index}: {e}")
+        return None
+
+    async def metrics_handler(self, request: web.Request) -> web.Response:
+        """ Metrics of all workers, each series labelled with its worker, plus whether each worker answered. """
+        outputs = await asyncio.gather(*(self._worker_metrics(i) for i in range(self.workers)))
+        up = ["# HELP bot_worker_up Whether the worker answered the metrics scrape.", "# TYPE bot_worker_up gauge"]
+        up += [f'bot_worker_up{{worker="{i}"}} {int(output is not None)}' for i, output in enumerate(outputs)]
+        merged = merge_worker_metrics({i: output for i, output in enumerate(outputs) if output is not None})
+        body = "\n".join(up) + "\n" + merged
+        return web.Response(body=body.encode(), headers={"Content-Type": "text/plain; version=0.0.4"})
+
+    async def telegram_handler(self, request: web.Request) -> web.Response:
+        try:
+            update = json.loads(await request.read())
+        except ValueError:
+            return web.Response(status=400)
+        return await self._forward(request, extract_chat_id(update))
+
+    async def yookassa_handler(self, request: web.Request) -> web.Response:
+        try:
+            notification = json.loads(await request.read())
+        except ValueError:
+            return web.Response(status=400)
+        return await self._forward(request, extract_payment_chat_id(notification))
+
+    async def _supervise_worker(self, index: int):
+        """ Runs a worker process and restarts it if it exits. """
+        env = dict(os.environ, WORKER_INDEX=str(index))
+        while True:
+            process = await asyncio.create_subprocess_exec(sys.executable, "-m", "bot.main", env=env)
+            self._processes.append(process)
+            logging.info(f"Started worker {index} (pid {process.pid}) on port {self.base_port + index}.")
+            return_code = await process.wait()
+            self._processes.remove(process)
+            logging.error(f"Worker {index} exited with code {return_code}, restarting...")
+            await asyncio.sleep(1)
+
+    async def run(self, webhook_path: str):
+        self._session = ClientSession(timeout=ClientTimeout(total=60))
+        supervisors = [asyncio.create_task(self._supervise_worker(i)) for i in range(self.workers)]
+
+        app = web.Application()
+        app.router.add_post(webhook_path, self.telegram_handler)
+        app.router.add_post("/yookassa_webhook", self.yookassa_handler)
+        if settings.METRICS_ENABLED:
+            app.router.add_get("/metrics", self.metrics_handler)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, host=settings.WEB_SERVER_HOST, port=settings.WEB_SERVER_PORT)
+        await site.start()
+        logging.info(f"Webhook front listening on port {settings.WEB_SERVER_PORT} with {self.workers} workers.")
+
+        try:
+            await asyncio.gather(*supervisors)
+        finally:
+            for process in self._processes:
+                process.terminate()
+            await runner.cleanup()
+            await self._session.close()